@@ -5,9 +5,34 @@ import streamlit as st
 from database import get_or_create_engine, User, RoleEnum
 from auth import authenticate_user, register_user, initialize_blood_groups, get_session
 from pages import donor_page, requester_page, staff_page, admin_page
+from jobs import start_scheduler
+from session_store import create_user_session, refresh_user_session, revoke_user_session
+from search import ensure_search_index
+from branches import initialize_branches
+import notifications  # noqa: F401  registers notification job handlers
+import archive  # noqa: F401  registers the nightly archive job
+import backup  # noqa: F401  registers the snapshot job
 from sqlalchemy.orm import Session
 
 
+@st.cache_resource
+def get_app_engine():
+    """
+    Engine shared by every browser session in this process
+    Schema checks, seed data and the search index are set up once per process
+    rather than once per browser session.
+    """
+    engine = get_or_create_engine()
+    session = get_session(engine)
+    initialize_blood_groups(session)
+    initialize_branches(session)
+    session.close()
+    ensure_search_index(engine)
+    # Background workers are shared by every browser session in this process
+    start_scheduler(engine)
+    return engine
+
+
 def init_session_state():
     """Initialize session state variables"""
     if "authenticated" not in st.session_state:
@@ -15,11 +40,22 @@ def init_session_state():
     if "user" not in st.session_state:
         st.session_state.user = None
     if "db_engine" not in st.session_state:
-        st.session_state.db_engine = get_or_create_engine()
-        # Initialize blood groups
+        st.session_state.db_engine = get_app_engine()
+    
+    # The session token lives in the URL so a login survives reloads and server
+    # restarts; it is rotated every SESSION_ROTATE_MINUTES, so old URLs expire
+    token = st.query_params.get("session")
+    if token:
         session = get_session(st.session_state.db_engine)
-        initialize_blood_groups(session)
+        current, profile = refresh_user_session(session, token)
         session.close()
+        
+        st.session_state.authenticated = profile is not None
+        st.session_state.user = profile
+        if not current:
+            del st.query_params["session"]
+        elif current != token:
+            st.query_params["session"] = current
 
 
 def login_page():
@@ -40,17 +76,14 @@ def login_page():
                 if email and password:
                     session = get_session(st.session_state.db_engine)
                     user, error = authenticate_user(session, email, password)
+                    if user:
+                        token, profile = create_user_session(session, user)
                     session.close()
                     
                     if user:
                         st.session_state.authenticated = True
-                        st.session_state.user = {
-                            "user_id": user.user_id,
-                            "email": user.email,
-                            "first_name": user.first_name,
-                            "last_name": user.last_name,
-                            "role": user.role.value if user.role else "donor"
-                        }
+                        st.session_state.user = profile
+                        st.query_params["session"] = token
                         st.success("Login successful!")
                         st.rerun()
                     else:
@@ -127,6 +160,12 @@ def main():
             st.title(f"Welcome, {user['first_name']}!")
         with col2:
             if st.button("Logout"):
+                token = st.query_params.get("session")
+                if token:
+                    session = get_session(st.session_state.db_engine)
+                    revoke_user_session(session, token)
+                    session.close()
+                    del st.query_params["session"]
                 st.session_state.authenticated = False
                 st.session_state.user = None
                 st.rerun()
@@ -0,0 +1,79 @@
+"""
+Hot/cold tiering for blood requests and donations
+
+Fulfilled or cancelled requests and donations older than the archive horizon
+are moved into blood_requests_archive and blood_donations_archive in small
+batches, keeping the tables the dashboards query small. History views read both
+tiers (see history.py), so archiving is invisible to users. Archived requests
+leave the search index along with the hot table, and their donor notifications
+are deleted with them: they are only kept to deliver and throttle alerts, which
+a request closed for ARCHIVE_AFTER_DAYS no longer needs.
+"""
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, literal, DateTime
+from sqlalchemy.orm import Session
+from database import BloodRequest, BloodDonation, BloodRequestArchive, BloodDonationArchive, Notification
+from jobs import register_job, schedule_periodic
+
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = 1000
+CLOSED_REQUEST_STATUSES = ["fulfilled", "cancelled"]
+
+
+def _move_batches(session: Session, source, target, id_column, condition, batch_size: int,
+                  dependents: tuple = ()) -> int:
+    """
+    Copy matching rows to the archive table and delete them, one batch per transaction
+    Rows of other tables referencing a moved row through a `dependents` column are deleted too.
+    """
+    columns = [column.name for column in source.__table__.columns]
+    moved = 0
+    while True:
+        ids = [row[0] for row in session.execute(select(id_column).where(condition).limit(batch_size))]
+        if not ids:
+            return moved
+
+        rows = select(
+            *[source.__table__.c[name] for name in columns],
+            literal(datetime.utcnow(), DateTime)
+        ).where(id_column.in_(ids))
+        session.execute(insert(target).from_select(columns + ["archived_at"], rows))
+        for column in dependents:
+            session.execute(delete(column.class_).where(column.in_(ids)))
+        session.execute(delete(source).where(id_column.in_(ids)))
+        session.commit()
+        moved += len(ids)
+
+
+def archive_history(session: Session, days: int = ARCHIVE_AFTER_DAYS,
+                    batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """
+    Move closed requests and donations older than `days` into the archive tables
+    Returns how many rows of each kind were moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    requests = _move_batches(
+        session, BloodRequest, BloodRequestArchive, BloodRequest.request_id,
+        BloodRequest.status.in_(CLOSED_REQUEST_STATUSES) & (BloodRequest.request_date < cutoff),
+        batch_size, dependents=(Notification.request_id,)
+    )
+
+    donations = _move_batches(
+        session, BloodDonation, BloodDonationArchive, BloodDonation.donation_id,
+        BloodDonation.donation_date < cutoff,
+        batch_size
+    )
+    return {"requests": requests, "donations": donations}
+
+
+@register_job("archive_history")
+def archive_history_job(session: Session, payload: dict) -> dict:
+    """Archive closed history older than payload['days'] (default ARCHIVE_AFTER_DAYS)"""
+    return archive_history(session, days=int(payload.get("days", ARCHIVE_AFTER_DAYS)))
+
+
+schedule_periodic("archive_history", 24 * 3600)
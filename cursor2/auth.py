@@ -2,8 +2,12 @@
 Authentication and authorization utilities
 """
 import bcrypt
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database import User, RoleEnum, GenderEnum, BloodGroup, init_db, get_session, get_or_create_engine
+from database import (
+    User, RoleEnum, GenderEnum, BloodGroup, BloodRequest, BloodDonation, BloodRequestArchive,
+    BloodDonationArchive, id_number, init_db, get_session, get_or_create_engine
+)
 from datetime import datetime, date
 import re
 
@@ -47,17 +51,26 @@ def generate_user_id(session: Session, prefix: str = "U") -> str:
     return f"{prefix}{new_num:04d}"
 
 
+# Archived rows keep their IDs, so new IDs must count past them too
+ARCHIVE_MODELS = {BloodRequest: BloodRequestArchive, BloodDonation: BloodDonationArchive}
+
+
+def allocate_ids(session: Session, model_class, id_field, prefix: str, count: int) -> list[str]:
+    """
+    Reserve count consecutive IDs after the highest existing one
+    Compares the numeric suffix, so RQ10000 counts after RQ9999.
+    """
+    models = [model_class] + ([ARCHIVE_MODELS[model_class]] if model_class in ARCHIVE_MODELS else [])
+    last_num = max(
+        session.query(func.max(id_number(getattr(model, id_field), prefix))).scalar() or 0
+        for model in models
+    )
+    return [f"{prefix}{num:04d}" for num in range(last_num + 1, last_num + count + 1)]
+
+
 def generate_id(session: Session, model_class, id_field, prefix: str) -> str:
     """Generate unique ID for any model"""
-    last_record = session.query(model_class).order_by(getattr(model_class, id_field).desc()).first()
-    if last_record:
-        last_id = getattr(last_record, id_field)
-        last_num = int(last_id.replace(prefix, ""))  # remove the prefix string completely
-
-        new_num = last_num + 1
-    else:
-        new_num = 1
-    return f"{prefix}{new_num:04d}"
+    return allocate_ids(session, model_class, id_field, prefix, 1)[0]
 
 
 def register_user(
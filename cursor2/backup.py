@@ -0,0 +1,412 @@
+"""
+Online backup, WAL shipping and point-in-time restore for Blood Management System
+
+Snapshots use SQLite's online backup API a few pages per step, so the app's
+readers and writers keep running while a copy is taken. For incremental
+backups, a shipper process takes a base snapshot and then copies newly
+committed WAL frames into segment files every few seconds. A restore replays
+the segments onto the base up to a chosen time, so you can restore to any point
+at shipping-interval granularity.
+
+Backup directory layout:
+
+    backups/
+        snapshot-<time>.db                one-off snapshots
+        chain-<time>/
+            base.db                       base snapshot of the chain
+            gen-0001.hdr                  WAL header of each WAL generation
+            gen-0001-000001.frames        committed frames shipped in one cycle
+            manifest.jsonl                one line per file, with sha256 and time
+
+Shipping requires the app to run with BACKUP_WAL_SHIPPING=1 so that only the
+shipper checkpoints the WAL (see database.configure_sqlite). If some other
+connection checkpoints and restarts the WAL, the shipper notices and starts a
+new chain instead of shipping an incomplete history.
+
+    python backup.py snapshot [--db PATH] [--dir DIR]
+    python backup.py ship     [--db PATH] [--dir DIR] [--interval SECONDS]
+    python backup.py restore  --to PATH [--dir DIR] [--at 2026-01-31T12:00:00]
+    python backup.py verify   [--dir DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+from jobs import register_job
+
+
+DEFAULT_DB_PATH = "blood_management.db"
+DEFAULT_BACKUP_DIR = "backups"
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+MAX_BACKUP_RESTARTS = 5
+SHIP_INTERVAL_SECONDS = 5
+CHECKPOINT_WAL_BYTES = 4 * 1024 * 1024
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _timestamp(moment: datetime = None) -> str:
+    return (moment or datetime.utcnow()).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def online_backup(db_path: str, dest_path: str, pages_per_step: int = BACKUP_PAGES_PER_STEP,
+                  sleep: float = BACKUP_STEP_SLEEP) -> dict:
+    """
+    Copy a live database with the online backup API
+    Copies pages_per_step pages at a time and sleeps between steps, so other
+    connections are never locked out for long. A write from another connection
+    restarts a stepped copy; if that keeps happening, finish in one pass, which
+    in WAL mode only holds a read snapshot and does not block writers.
+    Returns page count, bytes, seconds and restarts.
+    """
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_BACKUP_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+
+    start = time.perf_counter()
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(dest_path)
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress, sleep=sleep)
+        except _TooManyRestarts:
+            source.backup(target, pages=-1)
+        pages = target.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+    return {
+        "pages": pages,
+        "bytes": os.path.getsize(dest_path),
+        "seconds": time.perf_counter() - start,
+        "restarts": restarts
+    }
+
+
+def integrity_ok(db_path: str) -> bool:
+    """Run SQLite's integrity check on a database file"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    finally:
+        conn.close()
+
+
+def take_snapshot(db_path: str = DEFAULT_DB_PATH, backup_dir: str = DEFAULT_BACKUP_DIR) -> dict:
+    """Write a verified one-off snapshot to the backup directory"""
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f"snapshot-{_timestamp()}.db")
+    stats = online_backup(db_path, path)
+    stats["path"] = path
+    stats["verified"] = integrity_ok(path)
+    return stats
+
+
+def _committed_frames(header: bytes, data: bytes, page_size: int) -> int:
+    """
+    Length of the leading run of committed frames in data
+    Frames belong to the current WAL generation while their salts match the
+    header. Frames after the last commit frame may still be rolled back and
+    overwritten, so they are left for a later cycle.
+    """
+    salt = header[16:24]
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    committed = 0
+    position = 0
+    while position + frame_size <= len(data):
+        frame_header = data[position:position + WAL_FRAME_HEADER_SIZE]
+        if frame_header[8:16] != salt:
+            break
+        position += frame_size
+        if struct.unpack(">I", frame_header[4:8])[0]:  # db size after commit; non-zero on commit frames
+            committed = position
+    return committed
+
+
+class WalShipper:
+    """Copies committed WAL frames of a live database into a backup chain"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, backup_dir: str = DEFAULT_BACKUP_DIR,
+                 checkpoint_bytes: int = CHECKPOINT_WAL_BYTES):
+        self.db_path = db_path
+        self.wal_path = db_path + "-wal"
+        self.backup_dir = backup_dir
+        self.checkpoint_bytes = checkpoint_bytes
+        self.chain_dir = None
+        # The shipper's connection also keeps the WAL from being deleted when the app closes
+        self._conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA wal_autocheckpoint=0")
+        self._checkpointer = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+
+    def close(self):
+        self._checkpointer.close()
+        self._conn.close()
+
+    def _record(self, entry: dict):
+        with open(os.path.join(self.chain_dir, "manifest.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _write_file(self, name: str, data: bytes, entry: dict):
+        path = os.path.join(self.chain_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        entry.update({"file": name, "sha256": hashlib.sha256(data).hexdigest()})
+        self._record(entry)
+
+    def start_chain(self):
+        """Take a new base snapshot; later frames are shipped relative to it"""
+        created = datetime.utcnow()
+        self.chain_dir = os.path.join(self.backup_dir, f"chain-{_timestamp(created)}")
+        os.makedirs(self.chain_dir)
+        base = os.path.join(self.chain_dir, "base.db")
+        online_backup(self.db_path, base)
+        self._record({"type": "base", "file": "base.db", "sha256": _sha256(base), "at": created.isoformat()})
+
+        self.generation = 0
+        self.header = None
+        self.offset = WAL_HEADER_SIZE
+        self.seq = 0
+        self.checkpointed_all = False
+
+    def _start_generation(self, header: bytes):
+        self.generation += 1
+        self.header = header
+        self.offset = WAL_HEADER_SIZE
+        self.seq = 0
+        self.checkpointed_all = False
+        self._write_file(f"gen-{self.generation:04d}.hdr", header, {
+            "type": "generation", "gen": self.generation, "at": datetime.utcnow().isoformat()
+        })
+
+    def ship_once(self) -> int:
+        """
+        Ship frames committed since the last cycle; returns the number of bytes shipped
+        Holds the write lock while reading the WAL, so no frame is half written.
+        """
+        if self.chain_dir is None:
+            self.start_chain()
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not os.path.exists(self.wal_path) or os.path.getsize(self.wal_path) < WAL_HEADER_SIZE:
+                return 0
+            with open(self.wal_path, "rb") as f:
+                header = f.read(WAL_HEADER_SIZE)
+                if self.header is not None and header[16:24] != self.header[16:24]:
+                    # New generation: only safe if our own full checkpoint allowed the restart.
+                    # A restart adds one to salt-1; the checkpoint sequence comes from the
+                    # restarting connection's own counter, so it can't tell restarts apart.
+                    expected_salt = (struct.unpack(">I", self.header[16:20])[0] + 1) & 0xFFFFFFFF
+                    if not self.checkpointed_all or struct.unpack(">I", header[16:20])[0] != expected_salt:
+                        self._conn.execute("ROLLBACK")
+                        self.start_chain()
+                        return self.ship_once()
+                    self._start_generation(header)
+                elif self.header is None:
+                    self._start_generation(header)
+
+                page_size = struct.unpack(">I", header[8:12])[0]
+                f.seek(self.offset)
+                data = f.read()
+
+            committed = _committed_frames(self.header, data, page_size)
+            if committed:
+                self.seq += 1
+                self._write_file(f"gen-{self.generation:04d}-{self.seq:06d}.frames", data[:committed], {
+                    "type": "frames", "gen": self.generation, "seq": self.seq,
+                    "frames": committed // (WAL_FRAME_HEADER_SIZE + page_size),
+                    "at": datetime.utcnow().isoformat()
+                })
+                self.offset += committed
+                self.checkpointed_all = False
+
+            if self.offset >= self.checkpoint_bytes:
+                # Everything is shipped and writers are locked out, so a checkpoint loses nothing
+                busy, log_frames, done = self._checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                shipped_frames = (self.offset - WAL_HEADER_SIZE) // (WAL_FRAME_HEADER_SIZE + page_size)
+                self.checkpointed_all = not busy and log_frames == done == shipped_frames
+            return committed
+        finally:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+
+    def run(self, interval: float = SHIP_INTERVAL_SECONDS):
+        """Ship forever, one cycle every interval seconds"""
+        self.start_chain()
+        try:
+            while True:
+                self.ship_once()
+                time.sleep(interval)
+        finally:
+            self.close()
+
+
+def _read_manifest(chain_dir: str) -> list[dict]:
+    with open(os.path.join(chain_dir, "manifest.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _chains(backup_dir: str) -> list[str]:
+    return sorted(
+        os.path.join(backup_dir, name) for name in os.listdir(backup_dir)
+        if name.startswith("chain-") and os.path.exists(os.path.join(backup_dir, name, "manifest.jsonl"))
+    )
+
+
+def _apply_wal(db_path: str, wal: bytes):
+    """Let SQLite recover a WAL file and checkpoint it into the database"""
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    with open(db_path + "-wal", "wb") as f:
+        f.write(wal)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+
+def restore_chain(chain_dir: str, target_path: str, at: datetime = None) -> dict:
+    """
+    Rebuild a database from a chain, replaying frames shipped at or before `at`
+    Returns the number of generations and frame segments applied.
+    """
+    manifest = _read_manifest(chain_dir)
+    work = target_path + ".restoring"
+    shutil.copyfile(os.path.join(chain_dir, "base.db"), work)
+
+    generations = {}
+    for entry in manifest:
+        if entry["type"] == "generation":
+            generations[entry["gen"]] = (entry, [])
+        elif entry["type"] == "frames" and (at is None or datetime.fromisoformat(entry["at"]) <= at):
+            generations[entry["gen"]][1].append(entry)
+
+    applied = 0
+    for gen in sorted(generations):
+        header_entry, segments = generations[gen]
+        if not segments:
+            break
+        with open(os.path.join(chain_dir, header_entry["file"]), "rb") as f:
+            wal = f.read()
+        for segment in sorted(segments, key=lambda e: e["seq"]):
+            with open(os.path.join(chain_dir, segment["file"]), "rb") as f:
+                wal += f.read()
+        _apply_wal(work, wal)
+        applied += len(segments)
+
+    conn = sqlite3.connect(work, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    os.replace(work, target_path)
+    return {"chain": chain_dir, "generations": len(generations), "segments": applied}
+
+
+def restore(backup_dir: str, target_path: str, at: datetime = None) -> dict:
+    """Restore the newest chain whose base was taken at or before `at` (default: latest state)"""
+    candidates = []
+    for chain_dir in _chains(backup_dir):
+        base = next(e for e in _read_manifest(chain_dir) if e["type"] == "base")
+        if at is None or datetime.fromisoformat(base["at"]) <= at:
+            candidates.append(chain_dir)
+    if not candidates:
+        raise ValueError("No backup chain covers the requested time")
+    return restore_chain(candidates[-1], target_path, at)
+
+
+def verify_backups(backup_dir: str = DEFAULT_BACKUP_DIR) -> list[dict]:
+    """Check checksums of every chain and snapshot, and that each restores to a sound database"""
+    results = []
+    for name in sorted(os.listdir(backup_dir)):
+        path = os.path.join(backup_dir, name)
+        if name.startswith("snapshot-") and name.endswith(".db"):
+            results.append({"backup": name, "ok": integrity_ok(path), "problem": None})
+
+    for chain_dir in _chains(backup_dir):
+        problem = None
+        for entry in _read_manifest(chain_dir):
+            if _sha256(os.path.join(chain_dir, entry["file"])) != entry["sha256"]:
+                problem = f"checksum mismatch in {entry['file']}"
+                break
+        if problem is None:
+            with tempfile.TemporaryDirectory() as tmp:
+                restored = os.path.join(tmp, "restored.db")
+                restore_chain(chain_dir, restored)
+                if not integrity_ok(restored):
+                    problem = "restored database failed integrity check"
+        results.append({"backup": os.path.basename(chain_dir), "ok": problem is None, "problem": problem})
+    return results
+
+
+@register_job("backup_snapshot")
+def backup_snapshot_job(session: Session, payload: dict) -> dict:
+    """Take a verified snapshot of the app database into payload['dir']"""
+    db_path = session.get_bind().url.database
+    stats = take_snapshot(db_path, payload.get("dir", DEFAULT_BACKUP_DIR))
+    if not stats["verified"]:
+        raise RuntimeError(f"Snapshot {stats['path']} failed integrity check")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blood Management System backups")
+    parser.add_argument("command", choices=["snapshot", "ship", "restore", "verify"])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--dir", default=DEFAULT_BACKUP_DIR)
+    parser.add_argument("--interval", type=float, default=SHIP_INTERVAL_SECONDS)
+    parser.add_argument("--to", help="restore target path")
+    parser.add_argument("--at", type=datetime.fromisoformat, help="restore point (UTC, ISO format)")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        print(json.dumps(take_snapshot(args.db, args.dir)))
+    elif args.command == "ship":
+        os.makedirs(args.dir, exist_ok=True)
+        WalShipper(args.db, args.dir).run(args.interval)
+    elif args.command == "restore":
+        if not args.to:
+            parser.error("restore needs --to")
+        print(json.dumps(restore(args.dir, args.to, args.at)))
+    else:
+        results = verify_backups(args.dir)
+        for result in results:
+            print(f"{'OK ' if result['ok'] else 'BAD'} {result['backup']} {result['problem'] or ''}")
+        raise SystemExit(0 if all(result["ok"] for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
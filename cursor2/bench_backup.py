@@ -0,0 +1,123 @@
+"""
+Benchmark online backups
+
+Measures snapshot throughput of the stepped online backup and the latency of a
+donor history page load (history.donation_history_page) from a concurrent
+reader, with and without a backup running. Runs against a temporary database:
+`python bench_backup.py [donations] [pages_per_step]`
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from database import User, BloodGroup, BloodDonation, RoleEnum, get_session, get_or_create_engine
+from auth import initialize_blood_groups
+from branches import initialize_branches, DEFAULT_BRANCH_ID
+from history import donation_history_page
+from backup import online_backup
+
+
+DONORS = 1000
+LOAD_SECONDS = 3
+
+
+def setup(db_path: str, donations: int):
+    engine = get_or_create_engine(db_path)
+    session = get_session(engine)
+    initialize_blood_groups(session)
+    initialize_branches(session)
+    session.execute(insert(User), [
+        {
+            "user_id": f"U{i:05d}", "first_name": "Donor", "email": f"donor{i}@example.com",
+            "mobile_no": f"9{i:09d}", "password_hash": "x", "pincode": "560001", "role": RoleEnum.DONOR
+        }
+        for i in range(DONORS)
+    ])
+    blood_id = session.query(BloodGroup.blood_id).filter(BloodGroup.blood_type == "O+").scalar()
+    start = datetime.utcnow() - timedelta(days=donations // 100)
+    for offset in range(0, donations, 10000):
+        session.execute(insert(BloodDonation), [
+            {
+                "donation_id": f"DN{i:07d}", "donor_id": f"U{i % DONORS:05d}", "blood_id": blood_id,
+                "donation_date": start + timedelta(minutes=i), "branch_id": DEFAULT_BRANCH_ID,
+                "notes": "Benchmark donation"
+            }
+            for i in range(offset, min(offset + 10000, donations))
+        ])
+        session.commit()
+    return engine, session
+
+
+def page_load_latencies(engine, stop: threading.Event) -> list[float]:
+    """Load donor history pages until stopped; returns each page's latency in ms"""
+    session = get_session(engine)
+    latencies = []
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        donation_history_page(session, f"U{i % DONORS:05d}")
+        session.rollback()
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+    session.close()
+    return latencies
+
+
+def measure(engine, work=None) -> list[float]:
+    stop = threading.Event()
+    latencies = []
+    reader = threading.Thread(target=lambda: latencies.extend(page_load_latencies(engine, stop)))
+    reader.start()
+    if work:
+        work()
+    else:
+        time.sleep(LOAD_SECONDS)
+    stop.set()
+    reader.join()
+    return latencies
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(label: str, latencies: list[float]):
+    print(f"{label}: {len(latencies)} page loads, "
+          f"p50 {percentile(latencies, 0.5):.2f}ms, p99 {percentile(latencies, 0.99):.2f}ms")
+
+
+def main():
+    donations = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    pages_per_step = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "live.db")
+        engine, session = setup(db_path, donations)
+        session.close()
+
+        report("no backup      ", measure(engine))
+
+        stats = {}
+        dest = os.path.join(tmp, "snapshot.db")
+
+        def run_backups():
+            deadline = time.perf_counter() + LOAD_SECONDS
+            while time.perf_counter() < deadline or not stats:
+                result = online_backup(db_path, dest, pages_per_step=pages_per_step)
+                stats["bytes"] = stats.get("bytes", 0) + result["bytes"]
+                stats["seconds"] = stats.get("seconds", 0) + result["seconds"]
+                stats["runs"] = stats.get("runs", 0) + 1
+
+        report("during backup  ", measure(engine, run_backups))
+        print(f"backup         : {stats['runs']} snapshots of {os.path.getsize(dest) / 1e6:.1f} MB, "
+              f"{stats['bytes'] / 1e6 / stats['seconds']:.0f} MB/s ({pages_per_step} pages per step)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark batch blood request submission
+
+Compares submit_requests() with the one-at-a-time path used by the requester
+form (generate_id + insert + commit per request). Runs against a temporary
+database: `python bench_batch_requests.py [total_requests] [batch_size]`
+"""
+import os
+import sys
+import tempfile
+import time
+
+from database import User, BloodGroup, BloodRequest, RoleEnum, get_session, get_or_create_engine
+from auth import initialize_blood_groups, generate_id
+from branches import initialize_branches
+from request_api import submit_requests
+
+
+BLOOD_TYPES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+
+def make_items(count: int) -> list:
+    return [
+        {
+            "blood_type": BLOOD_TYPES[i % len(BLOOD_TYPES)],
+            "units_required": 1 + i % 4,
+            "urgency": "urgent" if i % 10 == 0 else "normal",
+            "hospital_name": "Benchmark General"
+        }
+        for i in range(count)
+    ]
+
+
+def setup(db_path: str):
+    engine = get_or_create_engine(db_path)
+    session = get_session(engine)
+    initialize_blood_groups(session)
+    initialize_branches(session)
+    session.add(User(
+        user_id="U0001", first_name="Bench", email="bench@example.com", mobile_no="9000000000",
+        password_hash="x", pincode="560001", role=RoleEnum.REQUESTER
+    ))
+    session.commit()
+    return engine, session
+
+
+def bench_batch(session, total: int, batch_size: int) -> float:
+    items = make_items(batch_size)
+    start = time.perf_counter()
+    for _ in range(total // batch_size):
+        results, errors = submit_requests(session, "U0001", items)
+        assert not errors, errors
+    return time.perf_counter() - start
+
+
+def bench_single(session, total: int) -> float:
+    blood_ids = dict(session.query(BloodGroup.blood_type, BloodGroup.blood_id).all())
+    start = time.perf_counter()
+    for item in make_items(total):
+        request_id = generate_id(session, BloodRequest, "request_id", "RQ")
+        session.add(BloodRequest(
+            request_id=request_id, requester_id="U0001", blood_id=blood_ids[item["blood_type"]],
+            units_required=item["units_required"], urgency=item["urgency"],
+            hospital_name=item["hospital_name"], status="pending"
+        ))
+        session.commit()
+    return time.perf_counter() - start
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    single_total = min(total, 1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, session = setup(os.path.join(tmp, "batch.db"))
+        elapsed = bench_batch(session, total, batch_size)
+        print(f"batch  : {total} requests in {elapsed:.2f}s ({total / elapsed:,.0f} req/s, batch size {batch_size})")
+        session.close()
+        engine.dispose()
+
+        engine, session = setup(os.path.join(tmp, "single.db"))
+        elapsed = bench_single(session, single_total)
+        print(f"single : {single_total} requests in {elapsed:.2f}s ({single_total / elapsed:,.0f} req/s)")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
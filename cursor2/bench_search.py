@@ -0,0 +1,94 @@
+"""
+Benchmark user search
+
+Loads users into a temporary database, builds the search index, and times
+search_users for common substrings, exact IDs, names, typos and short
+prefixes (best of a few runs each):
+`python bench_search.py [users] [runs]`
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert
+from database import User, RoleEnum, get_session, get_or_create_engine
+from search import ensure_search_index, search_users
+
+
+FIRST_NAMES = [
+    "Aditya", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rohan", "Isha",
+    "Karan", "Meera", "Siddharth", "Pooja", "Nikhil", "Divya", "Manish", "Neha", "Suresh", "Lakshmi"
+]
+LAST_NAMES = [
+    "Sharma", "Verma", "Iyer", "Reddy", "Nair", "Patel", "Gupta", "Rao", "Menon", "Das",
+    "Kulkarni", "Joshi", "Singh", "Chopra", "Bose", "Pillai", "Mehta", "Kapoor", "Shetty", "Banerjee"
+]
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "hospital.org"]
+BATCH = 50000
+
+# term -> what it exercises
+TERMS = {
+    "gmail": "substring in most rows",
+    "user12345": "exact email stem",
+    "Sharma": "common last name",
+    "Adtiya": "typo, fuzzy fallback",
+    "Kulkarnee": "typo of a common name",
+    "zq": "short term, no match",
+    "Sh": "short prefix",
+}
+
+
+def setup(db_path: str, users: int):
+    engine = get_or_create_engine(db_path)
+    session = get_session(engine)
+    for offset in range(0, users, BATCH):
+        session.execute(insert(User), [
+            {
+                "user_id": f"U{i:07d}",
+                "first_name": FIRST_NAMES[i % len(FIRST_NAMES)],
+                "last_name": LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)],
+                "email": f"user{i}@{DOMAINS[i % len(DOMAINS)]}",
+                "mobile_no": f"9{i:09d}",
+                "password_hash": "x",
+                "pincode": "560001",
+                "role": RoleEnum.DONOR
+            }
+            for i in range(offset, min(offset + BATCH, users))
+        ])
+        session.commit()
+    session.close()
+    ensure_search_index(engine)
+    return engine
+
+
+def best_ms(engine, term: str, runs: int) -> tuple[float, int]:
+    session = get_session(engine)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = search_users(session, term)
+        times.append((time.perf_counter() - start) * 1000)
+        session.rollback()
+    session.close()
+    return min(times), len(results)
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        engine = setup(os.path.join(tmp, "search.db"), users)
+        print(f"loaded and indexed {users:,} users in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'term':<12}{'ms':>9}{'rows':>6}   case")
+        for term, case in TERMS.items():
+            ms, rows = best_ms(engine, term, runs)
+            print(f"{term:<12}{ms:>9.1f}{rows:>6}   {case}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark cold start and per-query statement overhead
+
+Measures, against a temporary database:
+- import time of each module a new app process loads, dependencies first
+  (streamlit, pages.py and app.py only when streamlit is installed)
+- engine startup with full DDL versus the stored schema version check
+- per-call time of the hot dashboard queries built as ORM queries on every call,
+  run as prebuilt statements, and run as prebuilt statements with the compiled
+  cache disabled (the cost of compiling them each time)
+
+`python bench_startup.py [calls_per_query]`
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from database import (
+    User, Branch, BloodGroup, BloodRequest, BloodDonation, BloodInventory, RoleEnum,
+    configure_sqlite, ensure_schema, migrate_schema, get_session, get_or_create_engine
+)
+from auth import initialize_blood_groups
+from branches import initialize_branches, DEFAULT_BRANCH_ID
+from history import donation_history_page
+from statements import (
+    BRANCH_LIST, STAFF_PENDING_REQUESTS, STAFF_RECENT_DONATIONS, ADMIN_USERS, ADMIN_STATISTICS,
+    branch_inventory_statement
+)
+
+
+IMPORT_RUNS = 5
+HAS_STREAMLIT = subprocess.run([sys.executable, "-c", "import streamlit"], capture_output=True).returncode == 0
+# Modules `import app` loads, dependencies first; pages.py and app.py need streamlit
+APP_MODULES = (["streamlit"] if HAS_STREAMLIT else []) + [
+    "database", "auth", "history", "statements", "jobs", "session_store", "search", "branches",
+    "notifications", "archive", "backup"
+] + (["pages", "app"] if HAS_STREAMLIT else [])
+
+
+def import_seconds(modules: str) -> float:
+    """Best wall time of a fresh interpreter importing modules, minus a bare interpreter"""
+    def best(code):
+        times = []
+        for _ in range(IMPORT_RUNS):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(__file__) or ".")
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return best(f"import {modules}") - best("pass")
+
+
+def engine_startup_ms(db_path: str, full_ddl: bool) -> float:
+    start = time.perf_counter()
+    engine = create_engine(f"sqlite:///{db_path}")
+    configure_sqlite(engine)
+    if full_ddl:
+        migrate_schema(engine)
+    else:
+        ensure_schema(engine)
+    with engine.connect():
+        pass
+    elapsed = (time.perf_counter() - start) * 1000
+    engine.dispose()
+    return elapsed
+
+
+def setup(db_path: str):
+    engine = get_or_create_engine(db_path)
+    session = get_session(engine)
+    initialize_blood_groups(session)
+    initialize_branches(session)
+    blood_ids = [blood_id for (blood_id,) in session.query(BloodGroup.blood_id)]
+    session.execute(insert(User), [
+        {
+            "user_id": f"U{i:04d}", "first_name": "User", "email": f"user{i}@example.com",
+            "mobile_no": f"9{i:09d}", "password_hash": "x", "pincode": "560001",
+            "role": RoleEnum.DONOR, "blood_id": blood_ids[i % len(blood_ids)]
+        }
+        for i in range(200)
+    ])
+    session.execute(insert(BloodRequest), [
+        {
+            "request_id": f"RQ{i:04d}", "requester_id": f"U{i % 200:04d}", "blood_id": blood_ids[i % 8],
+            "units_required": 1, "urgency": "normal", "status": "pending" if i % 4 else "fulfilled",
+            "branch_id": DEFAULT_BRANCH_ID
+        }
+        for i in range(40)
+    ])
+    session.execute(insert(BloodDonation), [
+        {
+            "donation_id": f"DN{i:04d}", "donor_id": f"U{i % 200:04d}", "blood_id": blood_ids[i % 8],
+            "branch_id": DEFAULT_BRANCH_ID
+        }
+        for i in range(500)
+    ])
+    session.execute(insert(BloodInventory), [
+        {"inventory_id": f"IN{i:04d}", "branch_id": DEFAULT_BRANCH_ID, "blood_id": blood_id, "units_available": 5}
+        for i, blood_id in enumerate(blood_ids)
+    ])
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+# Hot queries as pages.py built them before statements.py: (ORM query per call, prebuilt statement)
+HOT_QUERIES = {
+    "branch list": (
+        lambda s: s.query(Branch.branch_id, Branch.name, Branch.pincode).order_by(
+            Branch.branch_id
+        ).all(),
+        lambda s: s.execute(BRANCH_LIST).all()
+    ),
+    "staff pending requests": (
+        lambda s: [
+            (req.blood_group.blood_type, req.requester.first_name)
+            for req in s.query(BloodRequest).filter(
+                BloodRequest.branch_id == DEFAULT_BRANCH_ID, BloodRequest.status == "pending"
+            ).order_by(BloodRequest.urgency.desc(), BloodRequest.request_date).all()
+        ],
+        lambda s: s.execute(STAFF_PENDING_REQUESTS, {"branch_id": DEFAULT_BRANCH_ID}).all()
+    ),
+    "staff recent donations": (
+        lambda s: [
+            (don.donor.first_name, don.blood_group.blood_type)
+            for don in s.query(BloodDonation).filter(
+                BloodDonation.branch_id == DEFAULT_BRANCH_ID
+            ).order_by(BloodDonation.donation_date.desc()).limit(20).all()
+        ],
+        lambda s: s.execute(STAFF_RECENT_DONATIONS, {"branch_id": DEFAULT_BRANCH_ID, "limit": 20}).all()
+    ),
+    "branch inventory": (
+        None,
+        lambda s: s.execute(branch_inventory_statement(DEFAULT_BRANCH_ID)).all()
+    ),
+    "admin users": (
+        lambda s: [(u.user_id, u.blood_group.blood_type if u.blood_group else None) for u in s.query(User).all()],
+        lambda s: s.execute(ADMIN_USERS).all()
+    ),
+    "admin statistics": (
+        lambda s: (
+            s.query(User).count(),
+            s.query(User).filter(User.role == RoleEnum.DONOR).count(),
+            s.query(BloodRequest).count(),
+            s.query(BloodDonation).count(),
+            s.query(BloodRequest).filter(BloodRequest.status == "pending").count()
+        ),
+        lambda s: s.execute(ADMIN_STATISTICS).one()
+    ),
+    "donor history page": (
+        None,
+        lambda s: donation_history_page(s, "U0001")
+    ),
+}
+
+
+def per_call_us(engine, run, calls: int) -> float:
+    session = get_session(engine)
+    run(session)  # warm the compiled cache
+    session.rollback()
+    start = time.perf_counter()
+    for _ in range(calls):
+        run(session)
+        session.rollback()
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    print("import, cumulative, dependencies first:")
+    previous = 0
+    for i, module in enumerate(APP_MODULES):
+        total = import_seconds(", ".join(APP_MODULES[:i + 1]))
+        print(f"  {module:<15}{total * 1000:>7.0f}ms  ({(total - previous) * 1000:+.0f}ms)")
+        previous = total
+    if not HAS_STREAMLIT:
+        print("  streamlit not installed; streamlit, pages and app not measured")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup(db_path)
+
+        full = min(engine_startup_ms(db_path, True) for _ in range(5))
+        skip = min(engine_startup_ms(db_path, False) for _ in range(5))
+        print(f"engine start, full DDL : {full:.1f}ms")
+        print(f"engine start, version  : {skip:.1f}ms")
+
+        cached = get_or_create_engine(db_path)
+        uncached = create_engine(f"sqlite:///{db_path}", query_cache_size=0)
+        configure_sqlite(uncached)
+
+        print(f"\n{'query':<24}{'ORM per call':>14}{'prebuilt':>12}{'no cache':>12}   (us per call)")
+        for name, (orm, prebuilt) in HOT_QUERIES.items():
+            orm_us = f"{per_call_us(cached, orm, calls):.0f}" if orm else "-"
+            print(
+                f"{name:<24}{orm_us:>14}"
+                f"{per_call_us(cached, prebuilt, calls):>12.0f}{per_call_us(uncached, prebuilt, calls):>12.0f}"
+            )
+        cached.dispose()
+        uncached.dispose()
+
+
+if __name__ == "__main__":
+    main()
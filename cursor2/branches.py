@@ -0,0 +1,229 @@
+"""
+Blood bank branches, per-branch inventory and inter-branch transfers
+
+Inventory, donations and requests each carry a branch_id, and the branch-scoped
+queries use indexes that lead with branch_id, so one branch's rows are read
+without scanning another's. Rows created before branches existed belong to the
+default branch.
+"""
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from database import User, Branch, BloodRequest, BloodDonation, BloodInventory, BloodTransfer, RoleEnum
+from auth import generate_id, validate_pincode
+from notifications import COMPATIBLE_DONORS
+from session_store import invalidate_user_profile
+from statements import BRANCH_LIST, RECENT_TRANSFERS, branch_inventory_statement, nearest_stock_statement
+
+
+DEFAULT_BRANCH_ID = "BR0001"
+DEFAULT_BRANCH_NAME = "Main Branch"
+DEFAULT_BRANCH_PINCODE = "100000"
+
+
+def initialize_branches(session: Session):
+    """Create the default branch and assign it any rows that have no branch yet"""
+    if not session.query(Branch.branch_id).filter(Branch.branch_id == DEFAULT_BRANCH_ID).first():
+        session.add(Branch(branch_id=DEFAULT_BRANCH_ID, name=DEFAULT_BRANCH_NAME, pincode=DEFAULT_BRANCH_PINCODE))
+        session.flush()
+
+    for model in (BloodInventory, BloodDonation, BloodRequest):
+        session.execute(
+            update(model).where(model.branch_id.is_(None)).values(branch_id=DEFAULT_BRANCH_ID)
+        )
+    session.execute(
+        update(User)
+        .where(User.role == RoleEnum.STAFF, User.branch_id.is_(None))
+        .values(branch_id=DEFAULT_BRANCH_ID)
+    )
+    session.commit()
+
+
+def user_branch_id(user: dict) -> str:
+    """Branch of a logged-in user's profile, falling back to the default branch"""
+    return user.get("branch_id") or DEFAULT_BRANCH_ID
+
+
+def list_branches(session: Session) -> list:
+    """All branches as (branch_id, name, pincode) rows"""
+    return session.execute(BRANCH_LIST).all()
+
+
+def create_branch(session: Session, name: str, pincode: str, address: str = None) -> tuple[Branch, str]:
+    """
+    Create a new branch
+    Returns (branch, error_message)
+    """
+    if not name:
+        return None, "Branch name is required"
+    if not validate_pincode(pincode):
+        return None, "Pincode must be 6 digits (100000-999999)"
+    if session.query(Branch.branch_id).filter(Branch.name == name).first():
+        return None, "A branch with this name already exists"
+
+    branch = Branch(
+        branch_id=generate_id(session, Branch, "branch_id", "BR"),
+        name=name,
+        pincode=pincode,
+        address=address
+    )
+    session.add(branch)
+    session.commit()
+    return branch, None
+
+
+def assign_user_branch(session: Session, user_id: str, branch_id: str) -> str:
+    """Bind a user (usually staff) to a branch; returns an error message or None"""
+    user = session.query(User).filter(User.user_id == user_id).first()
+    if not user:
+        return "User not found"
+    if not session.query(Branch.branch_id).filter(Branch.branch_id == branch_id).first():
+        return "Branch not found"
+
+    user.branch_id = branch_id
+    invalidate_user_profile(session, user_id)
+    session.commit()
+    return None
+
+
+def get_inventory(session: Session, branch_id: str, blood_id: str) -> BloodInventory:
+    """Inventory row of one blood group at one branch"""
+    return session.query(BloodInventory).filter(
+        BloodInventory.branch_id == branch_id,
+        BloodInventory.blood_id == blood_id
+    ).first()
+
+
+def add_units(session: Session, branch_id: str, blood_id: str, units: int) -> BloodInventory:
+    """Add units to a branch's inventory, creating the row if needed (caller commits)"""
+    inventory = get_inventory(session, branch_id, blood_id)
+    if not inventory:
+        inventory = BloodInventory(
+            inventory_id=generate_id(session, BloodInventory, "inventory_id", "IN"),
+            branch_id=branch_id,
+            blood_id=blood_id,
+            units_available=units
+        )
+        session.add(inventory)
+    else:
+        inventory.units_available += units
+    return inventory
+
+
+def branch_inventory(session: Session, branch_id: str = None) -> list:
+    """Inventory levels for one branch, or every branch when branch_id is None"""
+    return session.execute(branch_inventory_statement(branch_id)).all()
+
+
+def fulfill_request(session: Session, request_id: str, branch_id: str) -> str:
+    """
+    Fulfil a pending request from a branch's stock in one transaction
+    Like transfer_units, the stock decrement only applies if enough units are
+    available, so it can't race a concurrent transfer or fulfilment.
+    Returns an error message or None.
+    """
+    request = session.query(BloodRequest).filter(
+        BloodRequest.request_id == request_id,
+        BloodRequest.status == "pending"
+    ).first()
+    if not request:
+        return "Request is no longer pending"
+
+    result = session.execute(
+        update(BloodInventory)
+        .where(
+            BloodInventory.branch_id == branch_id,
+            BloodInventory.blood_id == request.blood_id,
+            BloodInventory.units_available >= request.units_required
+        )
+        .values(units_available=BloodInventory.units_available - request.units_required)
+    )
+    if result.rowcount != 1:
+        session.rollback()
+        return "Not enough units available at this branch"
+
+    result = session.execute(
+        update(BloodRequest)
+        .where(BloodRequest.request_id == request_id, BloodRequest.status == "pending")
+        .values(status="fulfilled", fulfilled_date=datetime.utcnow())
+    )
+    if result.rowcount != 1:
+        session.rollback()
+        return "Request is no longer pending"
+
+    session.commit()
+    return None
+
+
+def transfer_units(
+    session: Session,
+    from_branch_id: str,
+    to_branch_id: str,
+    blood_id: str,
+    units: int,
+    transferred_by: str = None,
+    notes: str = None
+) -> tuple[BloodTransfer, str]:
+    """
+    Move units between branches in one transaction
+    The source decrement only applies if enough units are available, so
+    concurrent transfers can never take the stock below zero.
+    Returns (transfer, error_message)
+    """
+    if from_branch_id == to_branch_id:
+        return None, "Source and destination branches must differ"
+    if units < 1:
+        return None, "Units must be at least 1"
+    if not session.query(Branch.branch_id).filter(Branch.branch_id == to_branch_id).first():
+        return None, "Destination branch not found"
+
+    result = session.execute(
+        update(BloodInventory)
+        .where(
+            BloodInventory.branch_id == from_branch_id,
+            BloodInventory.blood_id == blood_id,
+            BloodInventory.units_available >= units
+        )
+        .values(units_available=BloodInventory.units_available - units)
+    )
+    if result.rowcount != 1:
+        session.rollback()
+        return None, "Not enough units available at the source branch"
+
+    add_units(session, to_branch_id, blood_id, units)
+    transfer = BloodTransfer(
+        transfer_id=generate_id(session, BloodTransfer, "transfer_id", "TR"),
+        from_branch_id=from_branch_id,
+        to_branch_id=to_branch_id,
+        blood_id=blood_id,
+        units=units,
+        transferred_by=transferred_by,
+        notes=notes
+    )
+    session.add(transfer)
+    session.commit()
+    return transfer, None
+
+
+def recent_transfers(session: Session, branch_id: str, limit: int = 20) -> list:
+    """Latest transfers into or out of a branch, with branch and blood type names"""
+    return session.execute(RECENT_TRANSFERS, {"branch_id": branch_id, "limit": limit}).all()
+
+
+def nearest_branch_with_stock(
+    session: Session,
+    blood_type: str,
+    units: int,
+    pincode: str,
+    exclude_branch_id: str = None
+):
+    """
+    Closest branch holding enough units of a compatible blood group, in one query
+    Distance is approximated by the numeric gap between pincodes; an exact blood
+    type match wins over a compatible substitute at the same distance.
+    Returns a row (branch_id, name, pincode, blood_id, blood_type, units_available) or None.
+    """
+    return session.execute(nearest_stock_statement(
+        blood_type, COMPATIBLE_DONORS.get(blood_type, [blood_type]), units, pincode, exclude_branch_id
+    )).first()
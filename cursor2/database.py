@@ -1,11 +1,17 @@
 """
 Database models and connection setup for Blood Management System
 """
-from sqlalchemy import create_engine, Column, String, Integer, Date, DateTime, ForeignKey, Enum
+from sqlalchemy import (
+    create_engine, event, inspect, text, select, insert, func, cast, literal_column, Column, String, Integer, Date, DateTime, ForeignKey, Enum, Text, Index,
+    UniqueConstraint
+)
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import enum
+import hashlib
+import os
 
 Base = declarative_base()
 
@@ -31,6 +37,16 @@ class BloodGroup(Base):
     description = Column(String(200))
 
 
+class Branch(Base):
+    __tablename__ = "branches"
+    
+    branch_id = Column(String(10), primary_key=True)
+    name = Column(String(200), nullable=False, unique=True)
+    pincode = Column(String(6), nullable=False)
+    address = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -47,9 +63,11 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_donation_date = Column(Date, nullable=True)
     role = Column(Enum(RoleEnum), default=RoleEnum.DONOR)
+    branch_id = Column(String(10), ForeignKey("branches.branch_id"), nullable=True)  # staff's home branch
     
     # Relationships
     blood_group = relationship("BloodGroup", backref="users")
+    branch = relationship("Branch")
     
     # Note: SQLite has limited CHECK constraint support
     # Validation is handled in auth.py instead
@@ -68,9 +86,18 @@ class BloodRequest(Base):
     request_date = Column(DateTime, default=datetime.utcnow)
     fulfilled_date = Column(DateTime, nullable=True)
     notes = Column(String(500), nullable=True)
+    branch_id = Column(String(10), ForeignKey("branches.branch_id"), nullable=True)
     
     requester = relationship("User", foreign_keys=[requester_id])
     blood_group = relationship("BloodGroup")
+    branch = relationship("Branch")
+    
+    __table_args__ = (
+        Index("ix_blood_requests_requester_date", "requester_id", "request_date"),
+        Index("ix_blood_requests_branch_status_date", "branch_id", "status", "request_date"),
+        Index("ix_blood_requests_status_date", "status", "request_date"),
+        Index("ix_blood_requests_date", "request_date"),
+    )
 
 
 class BloodDonation(Base):
@@ -84,9 +111,17 @@ class BloodDonation(Base):
     status = Column(String(20), default="completed")  # completed, pending, rejected
     health_check_passed = Column(String(10), default="yes")  # yes, no
     notes = Column(String(500), nullable=True)
+    branch_id = Column(String(10), ForeignKey("branches.branch_id"), nullable=True)
     
     donor = relationship("User", foreign_keys=[donor_id])
     blood_group = relationship("BloodGroup")
+    branch = relationship("Branch")
+    
+    __table_args__ = (
+        Index("ix_blood_donations_donor_date", "donor_id", "donation_date"),
+        Index("ix_blood_donations_branch_date", "branch_id", "donation_date"),
+        Index("ix_blood_donations_date", "donation_date"),
+    )
 
 
 class BloodInventory(Base):
@@ -97,15 +132,259 @@ class BloodInventory(Base):
     units_available = Column(Integer, default=0)
     units_reserved = Column(Integer, default=0)
     last_updated = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    branch_id = Column(String(10), ForeignKey("branches.branch_id"), nullable=True)
+    
+    blood_group = relationship("BloodGroup")
+    branch = relationship("Branch")
+    
+    __table_args__ = (
+        Index("ux_blood_inventory_branch_blood", "branch_id", "blood_id", unique=True),
+    )
+
+
+# Closed requests moved out of blood_requests by archive.py
+class BloodRequestArchive(Base):
+    __tablename__ = "blood_requests_archive"
+    
+    request_id = Column(String(10), primary_key=True)
+    requester_id = Column(String(10), nullable=False)
+    blood_id = Column(String(10), nullable=False)
+    units_required = Column(Integer, nullable=False)
+    urgency = Column(String(20))
+    status = Column(String(20))
+    hospital_name = Column(String(200), nullable=True)
+    request_date = Column(DateTime)
+    fulfilled_date = Column(DateTime, nullable=True)
+    notes = Column(String(500), nullable=True)
+    branch_id = Column(String(10), nullable=True)
+    archived_at = Column(DateTime, nullable=False)
     
+    __table_args__ = (
+        Index("ix_blood_requests_archive_requester_date", "requester_id", "request_date"),
+        Index("ix_blood_requests_archive_date", "request_date"),
+    )
+
+
+# Old donations moved out of blood_donations by archive.py
+class BloodDonationArchive(Base):
+    __tablename__ = "blood_donations_archive"
+    
+    donation_id = Column(String(10), primary_key=True)
+    donor_id = Column(String(10), nullable=False)
+    blood_id = Column(String(10), nullable=False)
+    donation_date = Column(DateTime)
+    units_donated = Column(Integer)
+    status = Column(String(20))
+    health_check_passed = Column(String(10))
+    notes = Column(String(500), nullable=True)
+    branch_id = Column(String(10), nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_blood_donations_archive_donor_date", "donor_id", "donation_date"),
+    )
+
+
+def id_number(id_column, prefix: str):
+    """
+    Numeric suffix of a prefixed string ID, so RQ10000 sorts after RQ9999
+    The offset is rendered inline so queries match the expression indexes below.
+    """
+    return cast(func.substr(id_column, literal_column(str(len(prefix) + 1))), Integer)
+
+
+# Expression indexes let max(id_number(...)) read one index entry instead of scanning
+Index("ix_blood_requests_id_number", id_number(BloodRequest.request_id, "RQ"))
+Index("ix_blood_donations_id_number", id_number(BloodDonation.donation_id, "DN"))
+Index("ix_blood_requests_archive_id_number", id_number(BloodRequestArchive.request_id, "RQ"))
+Index("ix_blood_donations_archive_id_number", id_number(BloodDonationArchive.donation_id, "DN"))
+
+# Case-insensitive indexes for short user search prefixes (search.search_users)
+Index("ix_users_first_name_nocase", User.first_name.collate("NOCASE"))
+Index("ix_users_last_name_nocase", User.last_name.collate("NOCASE"))
+Index("ix_users_email_nocase", User.email.collate("NOCASE"))
+Index("ix_users_mobile_no_nocase", User.mobile_no.collate("NOCASE"))
+
+
+class BloodTransfer(Base):
+    __tablename__ = "blood_transfers"
+    
+    transfer_id = Column(String(10), primary_key=True)
+    from_branch_id = Column(String(10), ForeignKey("branches.branch_id"), nullable=False)
+    to_branch_id = Column(String(10), ForeignKey("branches.branch_id"), nullable=False)
+    blood_id = Column(String(10), ForeignKey("blood_groups.blood_id"), nullable=False)
+    units = Column(Integer, nullable=False)
+    transferred_by = Column(String(10), ForeignKey("users.user_id"), nullable=True)
+    transfer_date = Column(DateTime, default=datetime.utcnow)
+    notes = Column(String(500), nullable=True)
+    
+    from_branch = relationship("Branch", foreign_keys=[from_branch_id])
+    to_branch = relationship("Branch", foreign_keys=[to_branch_id])
     blood_group = relationship("BloodGroup")
 
 
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+    
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    job_type = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=True)  # JSON encoded handler arguments
+    status = Column(String(20), default="queued", index=True)  # queued, running, succeeded, failed
+    priority = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_at = Column(DateTime, default=datetime.utcnow, index=True)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    dedupe_key = Column(String(100), nullable=True, unique=True)  # one enqueue per periodic slot
+    submitted_by = Column(String(10), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)
+    last_error = Column(String(500), nullable=True)
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    
+    notification_id = Column(Integer, primary_key=True, autoincrement=True)
+    request_id = Column(String(10), ForeignKey("blood_requests.request_id"), nullable=False)
+    user_id = Column(String(10), ForeignKey("users.user_id"), nullable=False)
+    channel = Column(String(20), default="email")
+    address = Column(String(255), nullable=False)
+    status = Column(String(20), default="queued")  # queued, sent, failed
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
+    
+    __table_args__ = (
+        UniqueConstraint("request_id", "user_id"),  # a donor hears about a request once
+        Index("ix_notifications_user_created", "user_id", "created_at"),
+        Index("ix_notifications_request_status", "request_id", "status"),
+    )
+
+
+class UserSession(Base):
+    __tablename__ = "user_sessions"
+    
+    session_id = Column(String(64), primary_key=True)
+    user_id = Column(String(10), ForeignKey("users.user_id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    profile = Column(Text, nullable=True)  # JSON user snapshot; NULL means reload from users
+    previous_session_id = Column(String(64), nullable=True, index=True)  # still accepted briefly after rotation
+    rotated_at = Column(DateTime, nullable=True)
+
+
+class AppSetting(Base):
+    __tablename__ = "app_settings"
+    
+    key = Column(String(50), primary_key=True)
+    value = Column(Text, nullable=True)
+
+
 # Database setup
+SCHEMA_VERSION_KEY = "schema_version"
+# Compiled SQL cache entries per engine; sized for the prebuilt statements, ORM
+# queries and lambda statement variants of every page (see statements.py)
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1200"))
+
+
+def configure_sqlite(engine):
+    """
+    Use WAL journaling so readers, writers and online backups don't block each other
+    With BACKUP_WAL_SHIPPING=1 only the backup shipper checkpoints, so no WAL
+    frame is checkpointed away before it has been shipped (see backup.py).
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        if os.environ.get("BACKUP_WAL_SHIPPING") == "1":
+            cursor.execute("PRAGMA wal_autocheckpoint=0")
+        cursor.close()
+
+
+def add_missing_columns(engine):
+    """Add nullable columns declared on models but missing from existing tables"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def create_indexes(engine):
+    """
+    Create indexes added to tables that already existed (create_all skips them)
+    Checks sqlite_master by name, since reflection can't see expression indexes.
+    """
+    with engine.connect() as conn:
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+
+
+def schema_fingerprint():
+    """Short hash of every table, column and index the models declare"""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{column.name}:{column.type!r}:{column.nullable}" for column in table.columns)
+        parts.extend(sorted(
+            f"{index.name}:{[column.name for column in index.columns]}:{index.unique}" for index in table.indexes
+        ))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def stored_schema_version(engine):
+    """Schema fingerprint recorded by the last migration, or None for a new database"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(AppSetting.value).where(AppSetting.key == SCHEMA_VERSION_KEY)
+            ).scalar()
+    except OperationalError:
+        return None
+
+
+def migrate_schema(engine):
+    """Create missing tables, columns and indexes, then record the schema version"""
+    Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    create_indexes(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(AppSetting).prefix_with("OR REPLACE").values(key=SCHEMA_VERSION_KEY, value=schema_fingerprint())
+        )
+
+
+def ensure_schema(engine):
+    """
+    Migrate only when the models changed since the database was last migrated
+    Reading one app_settings row is much cheaper than create_all's reflection,
+    so processes after the first start without running any DDL.
+    """
+    if stored_schema_version(engine) != schema_fingerprint():
+        migrate_schema(engine)
+
+
 def init_db(db_path="blood_management.db"):
     """Initialize database and create tables"""
-    engine = create_engine(f"sqlite:///{db_path}", echo=False)
-    Base.metadata.create_all(engine)
+    engine = create_engine(f"sqlite:///{db_path}", echo=False, query_cache_size=QUERY_CACHE_SIZE)
+    configure_sqlite(engine)
+    migrate_schema(engine)
     return engine
 
 
@@ -117,7 +396,7 @@ def get_session(engine):
 
 def get_or_create_engine(db_path="blood_management.db"):
     """Get or create database engine"""
-    engine = create_engine(f"sqlite:///{db_path}", echo=False)
-    Base.metadata.create_all(engine)
+    engine = create_engine(f"sqlite:///{db_path}", echo=False, query_cache_size=QUERY_CACHE_SIZE)
+    configure_sqlite(engine)
+    ensure_schema(engine)
     return engine
-
@@ -0,0 +1,122 @@
+"""
+Paginated donation and request history for Blood Management System
+
+History pages select only the columns the views show and use keyset (cursor)
+pagination on (date, id), so each page costs the same no matter how long the
+history is. Pages merge the hot tables with their archive tables (archive.py).
+Page statements are built once per shape with bind parameters, so reruns reuse
+their compiled SQL.
+"""
+from functools import lru_cache
+
+from sqlalchemy import select, union_all, bindparam, literal, or_, and_
+from sqlalchemy.orm import Session
+from database import (
+    User, BloodGroup, BloodRequest, BloodDonation, BloodRequestArchive, BloodDonationArchive
+)
+
+
+HISTORY_PAGE_SIZE = 50
+
+DONATION_FIELDS = ("donation_date", "donation_id", "units_donated", "status", "notes")
+REQUEST_FIELDS = (
+    "request_date", "request_id", "units_required", "urgency", "status", "hospital_name", "notes"
+)
+ADMIN_REQUEST_FIELDS = ("request_date", "request_id", "units_required", "urgency", "status")
+
+
+def _after_cursor(date_column, id_column):
+    """Rows that sort after the cursor (:last_date, :last_id) in (date desc, id desc) order"""
+    return or_(
+        date_column < bindparam("last_date"),
+        and_(date_column == bindparam("last_date"), id_column < bindparam("last_id"))
+    )
+
+
+def _tier(model, fields: tuple, owner_field: str, with_cursor: bool, archived: bool):
+    """
+    One tier's next rows, newest first; fields start with (date, id)
+    Without owner_field the tier spans every owner and adds the requester's name.
+    """
+    date_column, id_column = getattr(model, fields[0]), getattr(model, fields[1])
+    stmt = select(
+        *[getattr(model, field).label(field) for field in fields],
+        BloodGroup.blood_type,
+        literal(archived).label("archived")
+    ).join(
+        BloodGroup, model.blood_id == BloodGroup.blood_id
+    )
+    if owner_field:
+        stmt = stmt.where(getattr(model, owner_field) == bindparam("owner_id"))
+    else:
+        stmt = stmt.add_columns(User.first_name, User.last_name).join(User, model.requester_id == User.user_id)
+    if with_cursor:
+        stmt = stmt.where(_after_cursor(date_column, id_column))
+    return stmt.order_by(date_column.desc(), id_column.desc()).limit(bindparam("limit")).subquery()
+
+
+@lru_cache(maxsize=None)
+def _page_statement(models: tuple, fields: tuple, owner_field: str, with_cursor: bool):
+    """
+    Keyset page over the hot table and, if given, its archive table, built once per shape
+    Params: owner_id (when owner_field is set), limit, and last_date/last_id after the first page.
+    """
+    tiers = [_tier(model, fields, owner_field, with_cursor, i > 0) for i, model in enumerate(models)]
+    merged = union_all(*[select(tier) for tier in tiers]).subquery()
+    return select(merged).order_by(
+        merged.c[fields[0]].desc(), merged.c[fields[1]].desc()
+    ).limit(bindparam("limit"))
+
+
+def _page(session: Session, models: tuple, fields: tuple, owner_field: str, owner_id: str,
+          cursor, page_size: int):
+    """
+    Keyset-paginate the hot and archive tables as one history
+    Each tier contributes at most page_size + 1 rows, so a page never scans more.
+    Returns (rows, next_cursor or None).
+    """
+    params = {"owner_id": owner_id, "limit": page_size + 1}
+    if cursor:
+        params["last_date"], params["last_id"] = cursor
+    rows = session.execute(_page_statement(models, fields, owner_field, bool(cursor)), params).all()
+
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, (last[0], last[1])
+
+
+def donation_history_page(session: Session, donor_id: str, cursor: tuple = None,
+                          page_size: int = HISTORY_PAGE_SIZE) -> tuple[list, tuple]:
+    """
+    One page of a donor's donations, newest first, including archived ones
+    Returns (rows, next_cursor); pass next_cursor back to get the following page.
+    """
+    return _page(
+        session, (BloodDonation, BloodDonationArchive), DONATION_FIELDS, "donor_id", donor_id,
+        cursor, page_size
+    )
+
+
+def request_history_page(session: Session, requester_id: str, cursor: tuple = None,
+                         page_size: int = HISTORY_PAGE_SIZE) -> tuple[list, tuple]:
+    """
+    One page of a requester's blood requests, newest first, including archived ones
+    Returns (rows, next_cursor); pass next_cursor back to get the following page.
+    """
+    return _page(
+        session, (BloodRequest, BloodRequestArchive), REQUEST_FIELDS, "requester_id", requester_id,
+        cursor, page_size
+    )
+
+
+def all_requests_page(session: Session, cursor: tuple = None, page_size: int = HISTORY_PAGE_SIZE,
+                      include_archived: bool = False) -> tuple[list, tuple]:
+    """
+    One page of every blood request with the requester's name, newest first
+    Archived requests are merged in (flagged by the archived column) when include_archived is set.
+    Returns (rows, next_cursor); pass next_cursor back to get the following page.
+    """
+    models = (BloodRequest, BloodRequestArchive) if include_archived else (BloodRequest,)
+    return _page(session, models, ADMIN_REQUEST_FIELDS, None, None, cursor, page_size)
@@ -0,0 +1,387 @@
+"""
+Background job scheduler for Blood Management System
+
+Jobs are stored in the background_jobs table so they survive restarts and can
+be shared by several app replicas. Workers claim a job by taking a time-limited
+lease on its row and renew it while the handler runs; a job whose lease expires
+(worker crashed) is picked up again, or failed by the scheduler's periodic
+sweep once it is out of attempts.
+Run `python worker.py` to start a standalone worker process.
+"""
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import BackgroundJob, BloodRequest, get_session
+
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_POLL_SECONDS = 2.0
+ABANDONED_SWEEP_SECONDS = 60
+RETRY_BASE_SECONDS = 5
+
+# job_type -> handler(session, payload) returning a JSON-serialisable result
+_handlers = {}
+
+# job_type -> (interval_seconds, payload) enqueued by the scheduler thread
+_periodic = {}
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def register_job(job_type: str):
+    """Decorator registering a handler for a job type"""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def registered_job_types() -> list[str]:
+    """Return the names of all registered job types"""
+    return sorted(_handlers)
+
+
+def schedule_periodic(job_type: str, interval_seconds: int, payload: dict = None):
+    """Enqueue a job of this type once every interval_seconds (across all replicas)"""
+    _periodic[job_type] = (interval_seconds, payload or {})
+
+
+def submit_job(
+    session: Session,
+    job_type: str,
+    payload: dict = None,
+    run_at: datetime = None,
+    max_attempts: int = 3,
+    priority: int = 0,
+    dedupe_key: str = None,
+    submitted_by: str = None
+) -> tuple[BackgroundJob, str]:
+    """
+    Queue a job for background execution
+    Returns (job, error_message)
+    """
+    if job_type not in _handlers:
+        return None, f"Unknown job type: {job_type}"
+
+    job = BackgroundJob(
+        job_type=job_type,
+        payload=json.dumps(payload or {}),
+        status="queued",
+        priority=priority,
+        max_attempts=max_attempts,
+        run_at=run_at or datetime.utcnow(),
+        dedupe_key=dedupe_key,
+        submitted_by=submitted_by
+    )
+    session.add(job)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return None, "Job already queued"
+    return job, None
+
+
+def queue_jobs(
+    session: Session,
+    job_type: str,
+    payloads: list[dict],
+    max_attempts: int = 3,
+    priority: int = 0,
+    submitted_by: str = None
+) -> str:
+    """
+    Queue one job per payload with a single insert, without committing
+    The jobs commit or roll back with the caller's own writes, so rows that
+    need a job never commit without it. Returns an error message, else None.
+    """
+    if job_type not in _handlers:
+        return f"Unknown job type: {job_type}"
+    if payloads:
+        now = datetime.utcnow()
+        session.execute(insert(BackgroundJob), [
+            {
+                "job_type": job_type,
+                "payload": json.dumps(payload),
+                "status": "queued",
+                "priority": priority,
+                "max_attempts": max_attempts,
+                "run_at": now,
+                "submitted_by": submitted_by
+            }
+            for payload in payloads
+        ])
+    return None
+
+
+def get_job(session: Session, job_id: int) -> BackgroundJob:
+    """Fetch a job by ID"""
+    return session.query(BackgroundJob).filter(BackgroundJob.job_id == job_id).first()
+
+
+def recent_jobs(session: Session, limit: int = 50) -> list[BackgroundJob]:
+    """Return the most recently created jobs"""
+    return session.query(BackgroundJob).order_by(BackgroundJob.job_id.desc()).limit(limit).all()
+
+
+def _claimable(now: datetime):
+    """Filter for jobs that are due, or whose lease expired with attempts left"""
+    return or_(
+        and_(BackgroundJob.status == "queued", BackgroundJob.run_at <= now),
+        and_(
+            BackgroundJob.status == "running",
+            BackgroundJob.lease_expires_at < now,
+            BackgroundJob.attempts < BackgroundJob.max_attempts
+        )
+    )
+
+
+def fail_abandoned_jobs(session: Session, now: datetime = None) -> int:
+    """
+    Fail jobs whose lease expired on their last attempt instead of running them again
+    Looks for them before updating, so a sweep that finds none doesn't take the write lock.
+    """
+    now = now or datetime.utcnow()
+    abandoned = and_(
+        BackgroundJob.status == "running",
+        BackgroundJob.lease_expires_at < now,
+        BackgroundJob.attempts >= BackgroundJob.max_attempts
+    )
+    if not session.query(BackgroundJob.job_id).filter(abandoned).first():
+        session.rollback()
+        return 0
+    result = session.execute(
+        update(BackgroundJob)
+        .where(abandoned)
+        .values(
+            status="failed",
+            finished_at=now,
+            lease_owner=None,
+            lease_expires_at=None,
+            last_error="Lease expired on the last attempt (worker stopped)"
+        )
+    )
+    session.commit()
+    return result.rowcount
+
+
+def renew_lease(session: Session, job_id: int, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+    """Extend this worker's lease on a running job; False if the lease was lost"""
+    result = session.execute(
+        update(BackgroundJob)
+        .where(
+            BackgroundJob.job_id == job_id,
+            BackgroundJob.lease_owner == worker_id,
+            BackgroundJob.status == "running"
+        )
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def claim_job(session: Session, worker_id: str, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> BackgroundJob:
+    """
+    Lease the next runnable job for this worker
+    The conditional UPDATE makes the claim atomic, so two workers never run the same job.
+    """
+    now = datetime.utcnow()
+    candidates = session.query(BackgroundJob.job_id).filter(
+        _claimable(now),
+        BackgroundJob.job_type.in_(list(_handlers))
+    ).order_by(
+        BackgroundJob.priority.desc(),
+        BackgroundJob.run_at
+    ).limit(5).all()
+
+    for (job_id,) in candidates:
+        result = session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.job_id == job_id, _claimable(now))
+            .values(
+                status="running",
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=BackgroundJob.attempts + 1,
+                started_at=now
+            )
+        )
+        session.commit()
+        if result.rowcount == 1:
+            return get_job(session, job_id)
+    return None
+
+
+def _finish_job(session: Session, job_id: int, worker_id: str, values: dict) -> bool:
+    """Write the outcome of a job if this worker still holds its lease"""
+    result = session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.job_id == job_id, BackgroundJob.lease_owner == worker_id)
+        .values(lease_owner=None, lease_expires_at=None, **values)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def _heartbeat(engine, job_id: int, worker_id: str, lease_seconds: int, done: threading.Event):
+    """Renew a job's lease every third of the lease until the handler finishes"""
+    session = get_session(engine)
+    try:
+        while not done.wait(lease_seconds / 3):
+            try:
+                if not renew_lease(session, job_id, worker_id, lease_seconds):
+                    return
+            except Exception:
+                session.rollback()
+    finally:
+        session.close()
+
+
+def run_job(session: Session, job: BackgroundJob, worker_id: str,
+            lease_seconds: int = DEFAULT_LEASE_SECONDS) -> bool:
+    """Execute a claimed job, keeping its lease alive, and record success, retry or failure"""
+    job_id = job.job_id
+    handler = _handlers[job.job_type]
+    payload = json.loads(job.payload or "{}")
+    attempts = job.attempts
+    max_attempts = job.max_attempts
+
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat, args=(session.get_bind(), job_id, worker_id, lease_seconds, done),
+        name=f"job-heartbeat-{job_id}", daemon=True
+    )
+    heartbeat.start()
+    try:
+        result = handler(session, payload)
+    except Exception as exc:
+        session.rollback()
+        error = f"{type(exc).__name__}: {exc}"[:500]
+        if attempts < max_attempts:
+            retry_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            _finish_job(session, job_id, worker_id, {
+                "status": "queued", "run_at": retry_at, "last_error": error
+            })
+        else:
+            _finish_job(session, job_id, worker_id, {
+                "status": "failed", "finished_at": datetime.utcnow(), "last_error": error
+            })
+        return False
+    finally:
+        done.set()
+        heartbeat.join()
+
+    return _finish_job(session, job_id, worker_id, {
+        "status": "succeeded",
+        "finished_at": datetime.utcnow(),
+        "result": json.dumps(result) if result is not None else None
+    })
+
+
+def enqueue_periodic_jobs(session: Session, now: datetime = None) -> int:
+    """
+    Queue due periodic jobs
+    The dedupe key names the interval slot, so only one replica's insert succeeds.
+    """
+    now = now or datetime.utcnow()
+    queued = 0
+    for job_type, (interval, payload) in _periodic.items():
+        slot = int(now.timestamp() // interval)
+        job, _ = submit_job(session, job_type, payload, dedupe_key=f"{job_type}:{slot}")
+        if job:
+            queued += 1
+    return queued
+
+
+class JobScheduler:
+    """Worker threads that poll the job table, plus a thread for periodic jobs and sweeps"""
+
+    def __init__(self, engine, num_workers: int = 2, poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.engine = engine
+        self.num_workers = num_workers
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start worker and periodic threads"""
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker_loop, args=(f"{self.node_id}:w{i}",),
+                name=f"job-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        thread = threading.Thread(target=self._periodic_loop, name="job-periodic", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Signal all threads to stop and wait for them"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stop.is_set():
+            session = get_session(self.engine)
+            try:
+                job = claim_job(session, worker_id, self.lease_seconds)
+                if job:
+                    run_job(session, job, worker_id, self.lease_seconds)
+            except Exception:
+                session.rollback()
+                job = None
+            finally:
+                session.close()
+
+            if not job:
+                self._stop.wait(self.poll_seconds)
+
+    def _periodic_loop(self):
+        while not self._stop.is_set():
+            session = get_session(self.engine)
+            try:
+                # Sweep here rather than on every poll, which would write every few seconds
+                fail_abandoned_jobs(session)
+                enqueue_periodic_jobs(session)
+            except Exception:
+                session.rollback()
+            finally:
+                session.close()
+            self._stop.wait(min([ABANDONED_SWEEP_SECONDS] + [interval for interval, _ in _periodic.values()]))
+
+
+def start_scheduler(engine, num_workers: int = 2) -> JobScheduler:
+    """Start the process-wide scheduler once; later calls return the running instance"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler(engine, num_workers=num_workers)
+            _scheduler.start()
+        return _scheduler
+
+
+@register_job("expire_stale_requests")
+def expire_stale_requests(session: Session, payload: dict) -> dict:
+    """Cancel pending requests older than payload['days'] (default 30)"""
+    cutoff = datetime.utcnow() - timedelta(days=int(payload.get("days", 30)))
+    count = session.query(BloodRequest).filter(
+        BloodRequest.status == "pending",
+        BloodRequest.request_date < cutoff
+    ).update({"status": "cancelled"}, synchronize_session=False)
+    session.commit()
+    return {"cancelled": count}
+
@@ -0,0 +1,304 @@
+"""
+Donor notification fan-out for critical blood requests
+
+Fan-out selects every eligible donor and queues their messages with a single
+INSERT ... SELECT, so the database does the matching and no per-donor queries
+are made. Delivery runs as a background job that sends each batch concurrently
+through a pluggable async sender.
+"""
+import asyncio
+import json
+import os
+import smtplib
+import threading
+from datetime import datetime, date, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import select, insert, update, literal, func, or_, exists, DateTime, Integer, String
+from sqlalchemy.orm import Session
+from database import User, BloodGroup, BloodRequest, Notification, RoleEnum
+from jobs import register_job, submit_job
+
+
+# Recipient blood type -> donor blood types it can receive
+COMPATIBLE_DONORS = {
+    "A+": ["A+", "A-", "O+", "O-"],
+    "A-": ["A-", "O-"],
+    "B+": ["B+", "B-", "O+", "O-"],
+    "B-": ["B-", "O-"],
+    "AB+": ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"],
+    "AB-": ["A-", "B-", "AB-", "O-"],
+    "O+": ["O+", "O-"],
+    "O-": ["O-"],
+}
+
+DONATION_INTERVAL_DAYS = 90   # minimum gap between whole-blood donations
+PINCODE_PREFIX_LENGTH = 3     # donors sharing this many leading pincode digits are "nearby"
+THROTTLE_HOURS = 24           # at most one notification per donor in this window
+MAX_SEND_ATTEMPTS = 3
+SEND_CONCURRENCY = 100
+DELIVERY_BATCH_SIZE = 1000
+
+
+class NotificationSender:
+    """Base class for async message senders"""
+
+    async def send(self, message: dict):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class FileSender(NotificationSender):
+    """Append messages as JSON lines to a local outbox file (development and tests)"""
+
+    def __init__(self, path: str = "notifications_outbox.jsonl"):
+        self.path = path
+        self._lines = []
+
+    async def send(self, message: dict):
+        self._lines.append(json.dumps(message))
+
+    async def close(self):
+        if self._lines:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._lines) + "\n")
+            self._lines = []
+
+
+class SMTPSender(NotificationSender):
+    """Send email over SMTP; defaults to a local debugging server on port 1025"""
+
+    def __init__(self, host: str = "localhost", port: int = 1025, from_addr: str = "bloodbank@localhost"):
+        self.host = host
+        self.port = port
+        self.from_addr = from_addr
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # smtplib connections are not thread safe, so keep one per executor thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=10)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _send_sync(self, message: dict):
+        email = EmailMessage()
+        email["From"] = self.from_addr
+        email["To"] = message["to"]
+        email["Subject"] = message["subject"]
+        email.set_content(message["body"])
+        self._connection().send_message(email)
+
+    async def send(self, message: dict):
+        await asyncio.to_thread(self._send_sync, message)
+
+    async def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.quit()
+            except smtplib.SMTPException:
+                pass
+        self._local = threading.local()
+
+
+def get_sender() -> NotificationSender:
+    """Build the sender selected by the NOTIFY_SENDER environment variable (file or smtp)"""
+    if os.environ.get("NOTIFY_SENDER", "file") == "smtp":
+        return SMTPSender(
+            host=os.environ.get("SMTP_HOST", "localhost"),
+            port=int(os.environ.get("SMTP_PORT", "1025"))
+        )
+    return FileSender(os.environ.get("NOTIFY_OUTBOX", "notifications_outbox.jsonl"))
+
+
+def fan_out_request(session: Session, request_id: str, now: datetime = None) -> int:
+    """
+    Queue notifications for all eligible donors of a request
+    Eligible donors have a compatible blood group, a nearby pincode, no donation
+    within DONATION_INTERVAL_DAYS and no notification within THROTTLE_HOURS.
+    Returns the number of notifications queued.
+    """
+    now = now or datetime.utcnow()
+    request = session.query(
+        BloodRequest.request_id, BloodRequest.requester_id, BloodGroup.blood_type, User.pincode
+    ).join(
+        BloodGroup, BloodRequest.blood_id == BloodGroup.blood_id
+    ).join(
+        User, BloodRequest.requester_id == User.user_id
+    ).filter(BloodRequest.request_id == request_id).first()
+
+    if not request:
+        return 0
+
+    donor_types = COMPATIBLE_DONORS.get(request.blood_type, [request.blood_type])
+    last_allowed_donation = date.today() - timedelta(days=DONATION_INTERVAL_DAYS)
+    recently_notified = exists().where(
+        Notification.user_id == User.user_id,
+        Notification.created_at >= now - timedelta(hours=THROTTLE_HOURS)
+    )
+
+    donors = select(
+        literal(request_id, String),
+        User.user_id,
+        literal("email", String),
+        User.email,
+        literal("queued", String),
+        literal(0, Integer),
+        literal(now, DateTime)
+    ).join(
+        BloodGroup, User.blood_id == BloodGroup.blood_id
+    ).where(
+        User.role == RoleEnum.DONOR,
+        User.user_id != request.requester_id,
+        BloodGroup.blood_type.in_(donor_types),
+        or_(User.last_donation_date.is_(None), User.last_donation_date <= last_allowed_donation),
+        func.substr(User.pincode, 1, PINCODE_PREFIX_LENGTH) == request.pincode[:PINCODE_PREFIX_LENGTH],
+        ~recently_notified
+    ).distinct()
+
+    # OR IGNORE skips donors already queued for this request (unique request_id, user_id)
+    result = session.execute(
+        insert(Notification).prefix_with("OR IGNORE").from_select(
+            ["request_id", "user_id", "channel", "address", "status", "attempts", "created_at"],
+            donors
+        )
+    )
+    session.commit()
+    return result.rowcount
+
+
+def build_message(request, first_name: str, address: str) -> dict:
+    """Compose the message sent to one donor"""
+    where = request.hospital_name or "a nearby hospital"
+    return {
+        "to": address,
+        "subject": f"Urgent: {request.blood_type} blood needed",
+        "body": (
+            f"Hi {first_name},\n\n"
+            f"A critical request for {request.units_required} unit(s) of {request.blood_type} blood "
+            f"has been raised at {where}. If you are able to donate, please contact the blood bank.\n"
+        )
+    }
+
+
+async def _send_batch(sender: NotificationSender, messages: list, concurrency: int):
+    """Send (notification_id, message) pairs; returns (sent_ids, {failed_id: error})"""
+    semaphore = asyncio.Semaphore(concurrency)
+    sent, failed = [], {}
+
+    async def send_one(notification_id, message):
+        async with semaphore:
+            try:
+                await sender.send(message)
+                sent.append(notification_id)
+            except Exception as exc:
+                failed[notification_id] = f"{type(exc).__name__}: {exc}"[:500]
+
+    await asyncio.gather(*(send_one(nid, msg) for nid, msg in messages))
+    await sender.close()
+    return sent, failed
+
+
+def deliver_request_notifications(
+    session: Session,
+    request_id: str,
+    sender: NotificationSender = None,
+    concurrency: int = SEND_CONCURRENCY,
+    batch_size: int = DELIVERY_BATCH_SIZE
+) -> dict:
+    """
+    Send all queued notifications of a request in batches
+    Returns counts of sent, failed (gave up) and pending (to retry) messages.
+    """
+    sender = sender or get_sender()
+    request = session.query(
+        BloodRequest.units_required, BloodRequest.hospital_name, BloodGroup.blood_type
+    ).join(
+        BloodGroup, BloodRequest.blood_id == BloodGroup.blood_id
+    ).filter(BloodRequest.request_id == request_id).first()
+
+    counts = {"sent": 0, "failed": 0, "pending": 0}
+    if not request:
+        return counts
+
+    last_id = 0
+    while True:
+        rows = session.query(
+            Notification.notification_id, Notification.address, Notification.attempts, User.first_name
+        ).join(
+            User, Notification.user_id == User.user_id
+        ).filter(
+            Notification.request_id == request_id,
+            Notification.status == "queued",
+            Notification.notification_id > last_id
+        ).order_by(Notification.notification_id).limit(batch_size).all()
+
+        if not rows:
+            break
+        last_id = rows[-1].notification_id
+
+        messages = [(row.notification_id, build_message(request, row.first_name, row.address)) for row in rows]
+        sent, failed = asyncio.run(_send_batch(sender, messages, concurrency))
+
+        now = datetime.utcnow()
+        if sent:
+            session.execute(
+                update(Notification)
+                .where(Notification.notification_id.in_(sent))
+                .values(status="sent", sent_at=now, attempts=Notification.attempts + 1)
+            )
+        attempts = {row.notification_id: row.attempts for row in rows}
+        for notification_id, error in failed.items():
+            gave_up = attempts[notification_id] + 1 >= MAX_SEND_ATTEMPTS
+            session.execute(
+                update(Notification)
+                .where(Notification.notification_id == notification_id)
+                .values(
+                    status="failed" if gave_up else "queued",
+                    attempts=Notification.attempts + 1,
+                    last_error=error
+                )
+            )
+            counts["failed" if gave_up else "pending"] += 1
+        session.commit()
+        counts["sent"] += len(sent)
+
+    return counts
+
+
+@register_job("notify_donors")
+def notify_donors_job(session: Session, payload: dict) -> dict:
+    """
+    Fan out a critical request, then queue its delivery
+    Delivery is queued whenever the request has queued notifications, not only
+    when this run inserted them, so a retry after a crash between the two steps
+    still delivers. The dedupe key keeps it to one delivery job per request.
+    """
+    request_id = payload["request_id"]
+    queued = fan_out_request(session, request_id)
+    pending = session.query(Notification.notification_id).filter(
+        Notification.request_id == request_id,
+        Notification.status == "queued"
+    ).first()
+    if pending:
+        submit_job(session, "deliver_notifications", {"request_id": request_id}, priority=10,
+                   dedupe_key=f"deliver:{request_id}")
+    return {"queued": queued}
+
+
+@register_job("deliver_notifications")
+def deliver_notifications_job(session: Session, payload: dict) -> dict:
+    """Send queued notifications; raises so the job is retried while any remain pending"""
+    counts = deliver_request_notifications(session, payload["request_id"])
+    if counts["pending"]:
+        raise RuntimeError(f"{counts['pending']} notifications pending retry")
+    return counts
@@ -2,12 +2,76 @@
 Role-based pages for different user types
 """
 import streamlit as st
-from database import (
-    get_session, User, BloodGroup, BloodRequest, BloodDonation, 
-    BloodInventory, RoleEnum, GenderEnum
-)
+from database import get_session, User, BloodRequest, BloodDonation, RoleEnum
 from datetime import datetime, date
+import json
 from auth import generate_id
+from jobs import submit_job, queue_jobs, recent_jobs, registered_job_types
+import notifications  # noqa: F401  registers notification job handlers
+from session_store import invalidate_user_profile
+from history import donation_history_page, request_history_page, all_requests_page
+from search import search_users, search_requests
+from branches import (
+    DEFAULT_BRANCH_ID, user_branch_id, list_branches, create_branch, assign_user_branch, add_units,
+    fulfill_request, branch_inventory, transfer_units, recent_transfers, nearest_branch_with_stock
+)
+from statements import (
+    BLOOD_GROUP_OPTIONS, STAFF_PENDING_REQUESTS, STAFF_RECENT_DONATIONS, ADMIN_USERS, ADMIN_STATISTICS,
+    STAFF_MEMBERS
+)
+
+
+def _render_history(engine, state_key, fetch_page, to_record, empty_message):
+    """
+    Show one page of a cursor-paginated history with "Newer" and "Older" buttons
+    Session state keeps the cursor each visited page starts at; a rerun re-reads
+    only the current page with one keyset query, however far back it is, so
+    status changes show up at a constant cost.
+    """
+    cursors = st.session_state.setdefault(state_key, [None])
+    
+    session = get_session(engine)
+    rows, next_cursor = fetch_page(session, cursors[-1])
+    session.close()
+    
+    if rows:
+        st.dataframe([to_record(row) for row in rows], use_container_width=True)
+    else:
+        st.info(empty_message)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(cursors) > 1 and st.button("Newer", key=f"{state_key}_newer"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if next_cursor and st.button("Older", key=f"{state_key}_older"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+
+def _render_search(engine, key):
+    """Search box for users and requests, shared by the staff and admin dashboards"""
+    term = st.text_input("Search by name, email, mobile, hospital or notes", key=f"{key}_term")
+    if not term:
+        return
+    
+    session = get_session(engine)
+    users = search_users(session, term)
+    requests = search_requests(session, term)
+    session.close()
+    
+    st.write("**Users**")
+    if users:
+        st.dataframe(users, use_container_width=True)
+    else:
+        st.info("No matching users.")
+    
+    st.write("**Blood Requests**")
+    if requests:
+        st.dataframe(requests, use_container_width=True)
+    else:
+        st.info("No matching requests.")
 
 
 def donor_page(engine, user):
@@ -17,37 +81,34 @@ def donor_page(engine, user):
     tab1, tab2, tab3 = st.tabs(["My Profile", "Donate Blood", "My Donations"])
     
     with tab1:
-        session = get_session(engine)
-        db_user = session.query(User).filter(User.user_id == user["user_id"]).first()
+        # `user` is the login session's profile snapshot, so no lookup is needed here
+        st.subheader("Profile Information")
+        col1, col2 = st.columns(2)
         
-        if db_user:
-            st.subheader("Profile Information")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write(f"**Name:** {db_user.first_name} {db_user.last_name or ''}")
-                st.write(f"**Email:** {db_user.email}")
-                st.write(f"**Mobile:** {db_user.mobile_no}")
-                st.write(f"**Pincode:** {db_user.pincode}")
-            
-            with col2:
-                st.write(f"**Blood Group:** {db_user.blood_group.blood_type if db_user.blood_group else 'Not set'}")
-                st.write(f"**Gender:** {db_user.gender.value if db_user.gender else 'Not set'}")
-                st.write(f"**Date of Birth:** {db_user.date_of_birth or 'Not set'}")
-                st.write(f"**Last Donation:** {db_user.last_donation_date or 'Never'}")
+        with col1:
+            st.write(f"**Name:** {user['first_name']} {user['last_name'] or ''}")
+            st.write(f"**Email:** {user['email']}")
+            st.write(f"**Mobile:** {user['mobile_no']}")
+            st.write(f"**Pincode:** {user['pincode']}")
         
-        session.close()
+        with col2:
+            st.write(f"**Blood Group:** {user['blood_type'] or 'Not set'}")
+            st.write(f"**Gender:** {user['gender'] or 'Not set'}")
+            st.write(f"**Date of Birth:** {user['date_of_birth'] or 'Not set'}")
+            st.write(f"**Last Donation:** {user['last_donation_date'] or 'Never'}")
     
     with tab2:
         st.subheader("Register Blood Donation")
         
-        session = get_session(engine)
-        db_user = session.query(User).filter(User.user_id == user["user_id"]).first()
-        
-        if not db_user.blood_group:
+        if not user["blood_id"]:
             st.warning("Please update your blood group in profile first.")
         else:
+            session = get_session(engine)
+            branch_options = {b.name: b.branch_id for b in list_branches(session)}
+            session.close()
+            
             with st.form("donation_form"):
+                branch_name = st.selectbox("Donation Centre", list(branch_options.keys()))
                 donation_date = st.date_input("Donation Date", value=date.today())
                 units = st.number_input("Units Donated", min_value=1, max_value=2, value=1)
                 health_check = st.selectbox("Health Check Passed", ["yes", "no"])
@@ -56,6 +117,8 @@ def donor_page(engine, user):
                 submit = st.form_submit_button("Submit Donation")
                 
                 if submit:
+                    session = get_session(engine)
+                    db_user = session.query(User).filter(User.user_id == user["user_id"]).first()
                     donation_id = generate_id(session, BloodDonation, "donation_id", "DN")
                     donation = BloodDonation(
                         donation_id=donation_id,
@@ -65,61 +128,38 @@ def donor_page(engine, user):
                         units_donated=units,
                         health_check_passed=health_check,
                         notes=notes,
-                        status="completed"
+                        status="completed",
+                        branch_id=branch_options[branch_name]
                     )
                     session.add(donation)
                     
                     # Update user's last donation date
                     db_user.last_donation_date = donation_date
+                    invalidate_user_profile(session, db_user.user_id)
                     
-                    # Update inventory
-                    inventory = session.query(BloodInventory).filter(
-                        BloodInventory.blood_id == db_user.blood_id
-                    ).first()
-                    
-                    if not inventory:
-                        inv_id = generate_id(session, BloodInventory, "inventory_id", "IN")
-                        inventory = BloodInventory(
-                            inventory_id=inv_id,
-                            blood_id=db_user.blood_id,
-                            units_available=units
-                        )
-                        session.add(inventory)
-                    else:
-                        inventory.units_available += units
+                    # Update the receiving branch's inventory
+                    add_units(session, branch_options[branch_name], db_user.blood_id, units)
                     
                     session.commit()
                     st.success("Donation recorded successfully!")
                     session.close()
                     st.rerun()
-        
-        session.close()
     
     with tab3:
         st.subheader("My Donation History")
-        session = get_session(engine)
-        donations = session.query(BloodDonation).filter(
-            BloodDonation.donor_id == user["user_id"]
-        ).order_by(BloodDonation.donation_date.desc()).all()
-        
-        if donations:
-            for donation in donations:
-                with st.container():
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.write(f"**Date:** {donation.donation_date.date()}")
-                    with col2:
-                        st.write(f"**Units:** {donation.units_donated}")
-                    with col3:
-                        st.write(f"**Status:** {donation.status}")
-                    st.write(f"**Blood Group:** {donation.blood_group.blood_type}")
-                    if donation.notes:
-                        st.write(f"*Notes: {donation.notes}*")
-                    st.markdown("---")
-        else:
-            st.info("No donations recorded yet.")
-        
-        session.close()
+        _render_history(
+            engine,
+            f"donation_history_{user['user_id']}",
+            lambda session, cursor: donation_history_page(session, user["user_id"], cursor),
+            lambda don: {
+                "Date": don.donation_date.date(),
+                "Blood Group": don.blood_type,
+                "Units": don.units_donated,
+                "Status": don.status,
+                "Notes": don.notes or ""
+            },
+            "No donations recorded yet."
+        )
 
 
 def requester_page(engine, user):
@@ -132,10 +172,11 @@ def requester_page(engine, user):
         st.subheader("Create Blood Request")
         session = get_session(engine)
         
-        blood_groups = session.query(BloodGroup).all()
-        blood_options = {bg.blood_type: bg.blood_id for bg in blood_groups}
+        blood_options = dict(session.execute(BLOOD_GROUP_OPTIONS).all())
+        branch_options = {b.name: b.branch_id for b in list_branches(session)}
         
         with st.form("request_form"):
+            branch_name = st.selectbox("Blood Bank Branch *", list(branch_options.keys()))
             blood_type = st.selectbox("Blood Group Required *", [""] + list(blood_options.keys()))
             units_required = st.number_input("Units Required *", min_value=1, max_value=10, value=1)
             urgency = st.selectbox("Urgency Level", ["normal", "urgent", "critical"])
@@ -157,9 +198,17 @@ def requester_page(engine, user):
                         urgency=urgency,
                         hospital_name=hospital_name,
                         notes=notes,
-                        status="pending"
+                        status="pending",
+                        branch_id=branch_options[branch_name]
                     )
                     session.add(request)
+                    if urgency == "critical":
+                        # Donor fan-out runs on a background worker, not in this rerun;
+                        # its job commits together with the request
+                        queue_jobs(
+                            session, "notify_donors", [{"request_id": request_id}],
+                            priority=10, submitted_by=user["user_id"]
+                        )
                     session.commit()
                     st.success("Blood request submitted successfully!")
                     session.close()
@@ -169,53 +218,49 @@ def requester_page(engine, user):
     
     with tab2:
         st.subheader("My Blood Requests")
-        session = get_session(engine)
-        requests = session.query(BloodRequest).filter(
-            BloodRequest.requester_id == user["user_id"]
-        ).order_by(BloodRequest.request_date.desc()).all()
-        
-        if requests:
-            for req in requests:
-                with st.container():
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.write(f"**Date:** {req.request_date.date()}")
-                    with col2:
-                        st.write(f"**Blood Group:** {req.blood_group.blood_type}")
-                    with col3:
-                        status_color = {"pending": "🟡", "fulfilled": "🟢", "cancelled": "🔴"}
-                        st.write(f"**Status:** {status_color.get(req.status, '⚪')} {req.status.upper()}")
-                    
-                    st.write(f"**Units Required:** {req.units_required}")
-                    st.write(f"**Urgency:** {req.urgency.upper()}")
-                    if req.hospital_name:
-                        st.write(f"**Hospital:** {req.hospital_name}")
-                    if req.notes:
-                        st.write(f"*Notes: {req.notes}*")
-                    st.markdown("---")
-        else:
-            st.info("No blood requests yet.")
-        
-        session.close()
+        status_color = {"pending": "🟡", "fulfilled": "🟢", "cancelled": "🔴"}
+        _render_history(
+            engine,
+            f"request_history_{user['user_id']}",
+            lambda session, cursor: request_history_page(session, user["user_id"], cursor),
+            lambda req: {
+                "Date": req.request_date.date(),
+                "Blood Group": req.blood_type,
+                "Units Required": req.units_required,
+                "Urgency": req.urgency.upper(),
+                "Status": f"{status_color.get(req.status, '⚪')} {req.status.upper()}",
+                "Hospital": req.hospital_name or "",
+                "Notes": req.notes or ""
+            },
+            "No blood requests yet."
+        )
 
 
 def staff_page(engine, user):
     """Staff page functionality"""
     st.header("🏥 Staff Dashboard")
     
-    tab1, tab2, tab3 = st.tabs(["Blood Inventory", "Pending Requests", "Donations"])
+    # Staff work on their own branch's inventory, requests and donations
+    branch_id = user_branch_id(user)
+    session = get_session(engine)
+    branches = {b.branch_id: b for b in list_branches(session)}
+    session.close()
+    branch = branches.get(branch_id) or branches[DEFAULT_BRANCH_ID]
+    st.caption(f"Branch: {branch.name}")
+    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Blood Inventory", "Pending Requests", "Donations", "Transfers", "Search"])
     
     with tab1:
         st.subheader("Blood Inventory Management")
         session = get_session(engine)
         
-        inventory = session.query(BloodInventory).all()
+        inventory = branch_inventory(session, branch.branch_id)
         
         if inventory:
             st.dataframe(
                 [
                     {
-                        "Blood Type": inv.blood_group.blood_type,
+                        "Blood Type": inv.blood_type,
                         "Available": inv.units_available,
                         "Reserved": inv.units_reserved,
                         "Total": inv.units_available + inv.units_reserved
@@ -233,12 +278,8 @@ def staff_page(engine, user):
         st.subheader("Pending Blood Requests")
         session = get_session(engine)
         
-        requests = session.query(BloodRequest).filter(
-            BloodRequest.status == "pending"
-        ).order_by(
-            BloodRequest.urgency.desc(),
-            BloodRequest.request_date
-        ).all()
+        # One query returns each request with its blood type, requester and branch stock
+        requests = session.execute(STAFF_PENDING_REQUESTS, {"branch_id": branch.branch_id}).all()
         
         if requests:
             for req in requests:
@@ -246,8 +287,8 @@ def staff_page(engine, user):
                     col1, col2 = st.columns([3, 1])
                     with col1:
                         st.write(f"**Request ID:** {req.request_id}")
-                        st.write(f"**Blood Group:** {req.blood_group.blood_type} | **Units:** {req.units_required}")
-                        st.write(f"**Requester:** {req.requester.first_name} {req.requester.last_name or ''}")
+                        st.write(f"**Blood Group:** {req.blood_type} | **Units:** {req.units_required}")
+                        st.write(f"**Requester:** {req.first_name} {req.last_name or ''}")
                         st.write(f"**Urgency:** {req.urgency.upper()}")
                         if req.hospital_name:
                             st.write(f"**Hospital:** {req.hospital_name}")
@@ -255,23 +296,31 @@ def staff_page(engine, user):
                     
                     with col2:
                         # Check if we have enough inventory
-                        inventory = session.query(BloodInventory).filter(
-                            BloodInventory.blood_id == req.blood_id
-                        ).first()
-                        
-                        available = inventory.units_available if inventory else 0
+                        available = req.units_available
                         
                         if available >= req.units_required:
                             if st.button("Fulfill", key=f"fulfill_{req.request_id}"):
-                                req.status = "fulfilled"
-                                req.fulfilled_date = datetime.utcnow()
-                                if inventory:
-                                    inventory.units_available -= req.units_required
-                                session.commit()
-                                st.success("Request fulfilled!")
-                                st.rerun()
+                                error = fulfill_request(session, req.request_id, branch.branch_id)
+                                if error:
+                                    st.error(error)
+                                else:
+                                    st.success("Request fulfilled!")
+                                    st.rerun()
                         else:
                             st.warning(f"Only {available} units available")
+                            # Looked up on demand so rendering the list stays one query
+                            if st.button("Find nearest stock", key=f"nearest_{req.request_id}"):
+                                nearest = nearest_branch_with_stock(
+                                    session, req.blood_type, req.units_required,
+                                    branch.pincode, exclude_branch_id=branch.branch_id
+                                )
+                                if nearest:
+                                    st.caption(
+                                        f"Nearest stock: {nearest.name} has "
+                                        f"{nearest.units_available} units of {nearest.blood_type}"
+                                    )
+                                else:
+                                    st.caption("No other branch has enough compatible units.")
                     
                     st.markdown("---")
         else:
@@ -283,17 +332,15 @@ def staff_page(engine, user):
         st.subheader("Recent Donations")
         session = get_session(engine)
         
-        donations = session.query(BloodDonation).order_by(
-            BloodDonation.donation_date.desc()
-        ).limit(20).all()
+        donations = session.execute(STAFF_RECENT_DONATIONS, {"branch_id": branch.branch_id, "limit": 20}).all()
         
         if donations:
             st.dataframe(
                 [
                     {
                         "Date": don.donation_date.date(),
-                        "Donor": f"{don.donor.first_name} {don.donor.last_name or ''}",
-                        "Blood Type": don.blood_group.blood_type,
+                        "Donor": f"{don.first_name} {don.last_name or ''}",
+                        "Blood Type": don.blood_type,
                         "Units": don.units_donated,
                         "Status": don.status
                     }
@@ -305,19 +352,74 @@ def staff_page(engine, user):
             st.info("No donations recorded yet.")
         
         session.close()
+    
+    with tab4:
+        st.subheader("Transfer Blood to Another Branch")
+        session = get_session(engine)
+        
+        other_branches = {b.name: b.branch_id for b in branches.values() if b.branch_id != branch.branch_id}
+        blood_options = dict(session.execute(BLOOD_GROUP_OPTIONS).all())
+        
+        if other_branches:
+            with st.form("transfer_form"):
+                to_branch = st.selectbox("Destination Branch", list(other_branches.keys()))
+                blood_type = st.selectbox("Blood Group", list(blood_options.keys()))
+                units = st.number_input("Units", min_value=1, value=1)
+                notes = st.text_area("Notes (optional)")
+                submit = st.form_submit_button("Transfer")
+                
+                if submit:
+                    transfer, error = transfer_units(
+                        session, branch.branch_id, other_branches[to_branch], blood_options[blood_type],
+                        int(units), transferred_by=user["user_id"], notes=notes or None
+                    )
+                    if transfer:
+                        st.success(f"Transferred {units} units of {blood_type} to {to_branch}")
+                    else:
+                        st.error(error)
+        else:
+            st.info("No other branches to transfer to.")
+        
+        st.subheader("Recent Transfers")
+        transfers = recent_transfers(session, branch.branch_id)
+        if transfers:
+            st.dataframe(
+                [
+                    {
+                        "Transfer ID": tr.transfer_id,
+                        "Date": tr.transfer_date,
+                        "From": tr.from_name,
+                        "To": tr.to_name,
+                        "Blood Type": tr.blood_type,
+                        "Units": tr.units
+                    }
+                    for tr in transfers
+                ],
+                use_container_width=True
+            )
+        else:
+            st.info("No transfers yet.")
+        
+        session.close()
+    
+    with tab5:
+        st.subheader("Search")
+        _render_search(engine, "staff_search")
 
 
 def admin_page(engine, user):
     """Admin page functionality"""
     st.header("⚙️ Admin Dashboard")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["Users", "Inventory", "All Requests", "Statistics"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(
+        ["Users", "Inventory", "All Requests", "Statistics", "Background Jobs", "Search", "Branches"]
+    )
     
     with tab1:
         st.subheader("User Management")
         session = get_session(engine)
         
-        users = session.query(User).all()
+        users = session.execute(ADMIN_USERS).all()
         
         if users:
             user_data = []
@@ -327,7 +429,7 @@ def admin_page(engine, user):
                     "Name": f"{u.first_name} {u.last_name or ''}",
                     "Email": u.email,
                     "Role": u.role.value if u.role else "donor",
-                    "Blood Type": u.blood_group.blood_type if u.blood_group else "N/A",
+                    "Blood Type": u.blood_type or "N/A",
                     "Mobile": u.mobile_no
                 })
             
@@ -344,6 +446,7 @@ def admin_page(engine, user):
                     target_user = session.query(User).filter(User.user_id == user_id).first()
                     if target_user:
                         target_user.role = RoleEnum[new_role.upper()]
+                        invalidate_user_profile(session, target_user.user_id)
                         session.commit()
                         st.success(f"Role updated to {new_role}")
                         st.rerun()
@@ -356,13 +459,14 @@ def admin_page(engine, user):
         st.subheader("Inventory Management")
         session = get_session(engine)
         
-        # Show current inventory
-        inventory = session.query(BloodInventory).all()
+        # Show current inventory of every branch
+        inventory = branch_inventory(session)
         if inventory:
             st.dataframe(
                 [
                     {
-                        "Blood Type": inv.blood_group.blood_type,
+                        "Branch": inv.branch_name,
+                        "Blood Type": inv.blood_type,
                         "Available": inv.units_available,
                         "Reserved": inv.units_reserved
                     }
@@ -377,54 +481,140 @@ def admin_page(engine, user):
     
     with tab3:
         st.subheader("All Blood Requests")
+        include_archived = st.checkbox("Include archived requests", key="admin_include_archived")
+        _render_history(
+            engine,
+            f"admin_requests_{'all' if include_archived else 'active'}",
+            lambda session, cursor: all_requests_page(session, cursor, include_archived=include_archived),
+            lambda req: {
+                "Request ID": req.request_id,
+                "Requester": f"{req.first_name} {req.last_name or ''}",
+                "Blood Type": req.blood_type,
+                "Units": req.units_required,
+                "Urgency": req.urgency,
+                "Status": f"{req.status} (archived)" if req.archived else req.status,
+                "Date": req.request_date.date()
+            },
+            "No requests found."
+        )
+    
+    with tab4:
+        st.subheader("System Statistics")
         session = get_session(engine)
         
-        requests = session.query(BloodRequest).order_by(
-            BloodRequest.request_date.desc()
-        ).all()
+        stats = session.execute(ADMIN_STATISTICS).one()
         
-        if requests:
+        col1, col2, col3, col4, col5 = st.columns(5)
+        with col1:
+            st.metric("Total Users", stats.total_users)
+        with col2:
+            st.metric("Donors", stats.total_donors)
+        with col3:
+            st.metric("Total Requests", stats.total_requests)
+        with col4:
+            st.metric("Total Donations", stats.total_donations)
+        with col5:
+            st.metric("Pending Requests", stats.pending_requests)
+        
+        session.close()
+    
+    with tab5:
+        st.subheader("Background Jobs")
+        session = get_session(engine)
+        
+        with st.form("submit_job"):
+            job_type = st.selectbox("Job Type", registered_job_types())
+            payload_text = st.text_area("Payload (JSON)", value="{}")
+            submit = st.form_submit_button("Queue Job")
+            
+            if submit:
+                try:
+                    payload = json.loads(payload_text or "{}")
+                except ValueError:
+                    payload = None
+                    st.error("Payload must be valid JSON")
+                
+                if payload is not None:
+                    job, error = submit_job(session, job_type, payload, submitted_by=user["user_id"])
+                    if job:
+                        st.success(f"Job {job.job_id} queued")
+                    else:
+                        st.error(error)
+        
+        # Jobs run on worker threads; refreshing only re-reads their status
+        st.button("Refresh Status", key="refresh_jobs")
+        jobs = recent_jobs(session)
+        if jobs:
             st.dataframe(
                 [
                     {
-                        "Request ID": req.request_id,
-                        "Requester": f"{req.requester.first_name} {req.requester.last_name or ''}",
-                        "Blood Type": req.blood_group.blood_type,
-                        "Units": req.units_required,
-                        "Urgency": req.urgency,
-                        "Status": req.status,
-                        "Date": req.request_date.date()
+                        "Job ID": job.job_id,
+                        "Type": job.job_type,
+                        "Status": job.status,
+                        "Attempts": f"{job.attempts}/{job.max_attempts}",
+                        "Created": job.created_at,
+                        "Finished": job.finished_at,
+                        "Result": job.result or "",
+                        "Error": job.last_error or ""
                     }
-                    for req in requests
+                    for job in jobs
                 ],
                 use_container_width=True
             )
         else:
-            st.info("No requests found.")
+            st.info("No jobs submitted yet.")
         
         session.close()
     
-    with tab4:
-        st.subheader("System Statistics")
+    with tab6:
+        st.subheader("Search")
+        _render_search(engine, "admin_search")
+    
+    with tab7:
+        st.subheader("Branches")
         session = get_session(engine)
         
-        total_users = session.query(User).count()
-        total_donors = session.query(User).filter(User.role == RoleEnum.DONOR).count()
-        total_requests = session.query(BloodRequest).count()
-        total_donations = session.query(BloodDonation).count()
-        pending_requests = session.query(BloodRequest).filter(BloodRequest.status == "pending").count()
-        
-        col1, col2, col3, col4, col5 = st.columns(5)
-        with col1:
-            st.metric("Total Users", total_users)
-        with col2:
-            st.metric("Donors", total_donors)
-        with col3:
-            st.metric("Total Requests", total_requests)
-        with col4:
-            st.metric("Total Donations", total_donations)
-        with col5:
-            st.metric("Pending Requests", pending_requests)
+        branches = list_branches(session)
+        st.dataframe(
+            [{"Branch ID": b.branch_id, "Name": b.name, "Pincode": b.pincode} for b in branches],
+            use_container_width=True
+        )
+        
+        st.subheader("Add Branch")
+        with st.form("create_branch"):
+            name = st.text_input("Branch Name *")
+            pincode = st.text_input("Pincode (6 digits) *")
+            address = st.text_area("Address")
+            submit = st.form_submit_button("Create Branch")
+            
+            if submit:
+                new_branch, error = create_branch(session, name, pincode, address or None)
+                if new_branch:
+                    st.success(f"Branch {new_branch.branch_id} created")
+                    st.rerun()
+                else:
+                    st.error(error)
+        
+        st.subheader("Assign Staff to Branch")
+        staff = session.execute(STAFF_MEMBERS).all()
+        if staff:
+            with st.form("assign_branch"):
+                staff_options = {
+                    f"{member.user_id} - {member.first_name} {member.last_name or ''}": member.user_id
+                    for member in staff
+                }
+                branch_options = {b.name: b.branch_id for b in branches}
+                staff_label = st.selectbox("Staff Member", list(staff_options.keys()))
+                branch_name = st.selectbox("Branch", list(branch_options.keys()))
+                submit = st.form_submit_button("Assign")
+                
+                if submit:
+                    error = assign_user_branch(session, staff_options[staff_label], branch_options[branch_name])
+                    if error:
+                        st.error(error)
+                    else:
+                        st.success(f"Assigned to {branch_name}")
+        else:
+            st.info("No staff users yet.")
         
         session.close()
-
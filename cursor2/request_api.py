@@ -0,0 +1,206 @@
+"""
+Batch blood request submission for hospital requesters
+
+submit_requests() validates a whole batch, allocates its request IDs as one
+block and inserts every row in a single transaction. Run `python request_api.py`
+to serve it over HTTP:
+
+    POST /requests
+    Authorization: Bearer <session token>
+    {"requests": [{"blood_type": "O+", "units_required": 2, "urgency": "urgent",
+                   "branch_id": "BR0001", "hospital_name": "City Hospital", "notes": "..."}]}
+
+branch_id is optional and defaults to the main branch.
+"""
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import User, Branch, BloodGroup, BloodRequest, BloodInventory, get_session, get_or_create_engine
+from auth import allocate_ids
+from branches import DEFAULT_BRANCH_ID
+from jobs import queue_jobs
+from session_store import resolve_user_session
+import notifications  # noqa: F401  registers notification job handlers
+
+
+URGENCY_LEVELS = ["normal", "urgent", "critical"]
+MAX_UNITS_PER_REQUEST = 10
+MAX_BATCH_SIZE = 5000
+ID_ALLOCATION_RETRIES = 3
+
+
+def _validate(item, blood_ids: dict, branch_ids: set) -> str:
+    """Return an error message for an invalid request item, else None"""
+    if not isinstance(item, dict):
+        return "must be an object"
+    for field in ("blood_type", "branch_id", "urgency", "hospital_name", "notes"):
+        if item.get(field) is not None and not isinstance(item[field], str):
+            return f"{field} must be a string"
+    if item.get("blood_type") not in blood_ids:
+        return f"unknown blood type {item.get('blood_type')!r}"
+    if item.get("branch_id", DEFAULT_BRANCH_ID) not in branch_ids:
+        return f"unknown branch {item.get('branch_id')!r}"
+    units = item.get("units_required")
+    if not isinstance(units, int) or isinstance(units, bool) or not 1 <= units <= MAX_UNITS_PER_REQUEST:
+        return f"units_required must be an integer from 1 to {MAX_UNITS_PER_REQUEST}"
+    if item.get("urgency", "normal") not in URGENCY_LEVELS:
+        return f"urgency must be one of {', '.join(URGENCY_LEVELS)}"
+    if len(item.get("hospital_name") or "") > 200:
+        return "hospital_name is longer than 200 characters"
+    if len(item.get("notes") or "") > 500:
+        return "notes is longer than 500 characters"
+    return None
+
+
+def allocate_request_ids(session: Session, count: int, prefix: str = "RQ") -> list[str]:
+    """Reserve a block of consecutive request IDs, numbered like generate_id()"""
+    return allocate_ids(session, BloodRequest, "request_id", prefix, count)
+
+
+def availability_hints(session: Session, blood_ids: list[str]) -> dict:
+    """Units available per (branch_id, blood_id), read in one query"""
+    rows = session.query(
+        BloodInventory.branch_id, BloodInventory.blood_id, BloodInventory.units_available
+    ).filter(BloodInventory.blood_id.in_(blood_ids)).all()
+    return {(branch_id, blood_id): units or 0 for branch_id, blood_id, units in rows}
+
+
+def submit_requests(session: Session, requester_id: str, items: list) -> tuple[list, list]:
+    """
+    Validate and insert a batch of blood requests in one transaction
+    Returns (results, errors). If any item is invalid nothing is inserted and
+    errors lists each problem; otherwise results has one entry per item with
+    its request ID and current stock for its blood group at its branch.
+    """
+    if not isinstance(items, list) or not items:
+        return [], ["requests must be a non-empty list"]
+    if len(items) > MAX_BATCH_SIZE:
+        return [], [f"at most {MAX_BATCH_SIZE} requests per batch"]
+    if not session.query(User.user_id).filter(User.user_id == requester_id).first():
+        return [], ["unknown requester"]
+
+    blood_ids = dict(session.query(BloodGroup.blood_type, BloodGroup.blood_id).all())
+    branch_ids = {branch_id for (branch_id,) in session.query(Branch.branch_id).all()}
+    errors = []
+    for i, item in enumerate(items):
+        error = _validate(item, blood_ids, branch_ids)
+        if error:
+            errors.append(f"request {i}: {error}")
+    if errors:
+        return [], errors
+
+    for attempt in range(ID_ALLOCATION_RETRIES):
+        request_ids = allocate_request_ids(session, len(items))
+        rows = [
+            {
+                "request_id": request_id,
+                "requester_id": requester_id,
+                "blood_id": blood_ids[item["blood_type"]],
+                "units_required": item["units_required"],
+                "urgency": item.get("urgency", "normal"),
+                "status": "pending",
+                "branch_id": item.get("branch_id", DEFAULT_BRANCH_ID),
+                "hospital_name": item.get("hospital_name"),
+                "notes": item.get("notes")
+            }
+            for request_id, item in zip(request_ids, items)
+        ]
+        try:
+            session.execute(insert(BloodRequest), rows)
+            # Donor fan-out jobs commit with the requests, so none is left without one
+            error = queue_jobs(
+                session, "notify_donors",
+                [{"request_id": row["request_id"]} for row in rows if row["urgency"] == "critical"],
+                priority=10, submitted_by=requester_id
+            )
+            if error:
+                session.rollback()
+                return [], [error]
+            session.commit()
+            break
+        except IntegrityError:
+            # Another writer took part of the block; allocate a fresh one
+            session.rollback()
+    else:
+        return [], ["could not allocate request IDs, please retry"]
+
+    stock = availability_hints(session, list({row["blood_id"] for row in rows}))
+    results = []
+    for row, item in zip(rows, items):
+        available = stock.get((row["branch_id"], row["blood_id"]), 0)
+        results.append({
+            "request_id": row["request_id"],
+            "branch_id": row["branch_id"],
+            "blood_type": item["blood_type"],
+            "units_required": row["units_required"],
+            "units_available": available,
+            "can_fulfill": available >= row["units_required"]
+        })
+    return results, []
+
+
+class RequestAPIHandler(BaseHTTPRequestHandler):
+    """HTTP front end for submit_requests"""
+
+    engine = None
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != "/requests":
+            self._send_json(404, {"errors": ["not found"]})
+            return
+
+        auth_header = self.headers.get("Authorization", "")
+        token = auth_header[len("Bearer "):] if auth_header.startswith("Bearer ") else None
+
+        session = get_session(self.engine)
+        try:
+            profile = resolve_user_session(session, token) if token else None
+            if not profile or profile["role"] not in ("requester", "staff", "admin"):
+                self._send_json(401, {"errors": ["invalid or unauthorized session token"]})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"errors": ["body must be valid JSON"]})
+                return
+
+            items = body.get("requests") if isinstance(body, dict) else None
+            results, errors = submit_requests(session, profile["user_id"], items)
+            if errors:
+                self._send_json(400, {"errors": errors})
+            else:
+                self._send_json(200, {"results": results})
+        finally:
+            session.close()
+
+
+def serve(engine, host: str = "127.0.0.1", port: int = 8600):
+    """Run the batch request HTTP service until interrupted"""
+    RequestAPIHandler.engine = engine
+    server = ThreadingHTTPServer((host, port), RequestAPIHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    serve(
+        get_or_create_engine(),
+        host=os.environ.get("REQUEST_API_HOST", "127.0.0.1"),
+        port=int(os.environ.get("REQUEST_API_PORT", "8600"))
+    )
@@ -0,0 +1,233 @@
+"""
+Full-text search over users and blood requests for Blood Management System
+
+Uses SQLite FTS5 tables with the trigram tokenizer, kept in sync with their
+source tables by triggers. A query first matches as a substring; if that finds
+too few rows, it falls back to a fuzzy match that ranks rows by how many of the
+query's trigrams they share, which tolerates typos.
+
+Each pass ranks a bounded set of candidate rows (SEARCH_CANDIDATES), never
+every match, so a substring found in most rows costs the same as a rare one.
+Ranking compares the row text with the term directly; FTS5's bm25 rank would
+first count every row matching the query. Fuzzy candidates come from the
+query's rarest trigrams, and a row must share at least half the trigrams.
+Terms shorter than a trigram use prefix ranges on case-insensitive indexes.
+
+The FTS tables index source rows by rowid. VACUUM may renumber rowids of tables
+without an INTEGER PRIMARY KEY, so run rebuild_search_index() after a VACUUM.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import RoleEnum
+from jobs import register_job
+
+
+SEARCH_LIMIT = 20
+SEARCH_CANDIDATES = 200
+MAX_FUZZY_TRIGRAMS = 16
+USER_PREFIX_COLUMNS = ["first_name", "last_name", "email", "mobile_no"]
+
+# FTS table -> (source table, indexed columns)
+SEARCH_TABLES = {
+    "users_fts": ("users", ["first_name", "last_name", "email", "mobile_no"]),
+    "blood_requests_fts": ("blood_requests", ["hospital_name", "notes"]),
+}
+
+
+def _create_statements(fts_table: str, source: str, columns: list[str]) -> list[str]:
+    cols = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    delete_old = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});"
+    )
+    insert_new = f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.rowid, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{cols}, content='{source}', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN {delete_old} END",
+        # Only text columns fire the update trigger, so status and role changes skip the index
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {source} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def ensure_search_index(engine):
+    """Create the FTS tables and sync triggers, indexing existing rows on first run"""
+    with engine.begin() as conn:
+        for fts_table, (source, columns) in SEARCH_TABLES.items():
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": fts_table}
+            ).first()
+            for statement in _create_statements(fts_table, source, columns):
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def rebuild_search_index(engine):
+    """Re-index every row from the source tables"""
+    with engine.begin() as conn:
+        for fts_table in SEARCH_TABLES:
+            conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def _phrase(term: str) -> str:
+    """Quote a string as an FTS5 phrase"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _document(fts_table: str) -> str:
+    """SQL for a row's indexed columns as one lower-case string"""
+    columns = SEARCH_TABLES[fts_table][1]
+    return "lower(" + " || char(10) || ".join(f"coalesce({c}, '')" for c in columns) + ")"
+
+
+def _ranked_rowids(session: Session, fts_table: str, match: str, score: str, params: dict,
+                   limit: int) -> list[int]:
+    """Rank at most SEARCH_CANDIDATES rows matching match by score (lowest first)"""
+    rows = session.execute(
+        text(
+            f"SELECT rowid FROM (SELECT rowid, {_document(fts_table)} AS doc FROM {fts_table} "
+            f"WHERE {fts_table} MATCH :match LIMIT :candidates) "
+            f"WHERE {score} IS NOT NULL ORDER BY {score}, rowid LIMIT :limit"
+        ),
+        {**params, "match": match, "candidates": SEARCH_CANDIDATES, "limit": limit}
+    ).all()
+    return [row[0] for row in rows]
+
+
+def _substring_rowids(session: Session, fts_table: str, term: str, limit: int) -> list[int]:
+    """Rows containing term, earliest match first (a match at the start of the name ranks top)"""
+    return _ranked_rowids(
+        session, fts_table, _phrase(term), "nullif(instr(doc, :needle), 0)", {"needle": term.lower()}, limit
+    )
+
+
+def _trigram_rows(session: Session, fts_table: str, trigram: str) -> int:
+    """Rows containing trigram, counted up to SEARCH_CANDIDATES"""
+    return session.execute(
+        text(f"SELECT count(*) FROM (SELECT 1 FROM {fts_table} WHERE {fts_table} MATCH :match LIMIT :candidates)"),
+        {"match": _phrase(trigram), "candidates": SEARCH_CANDIDATES}
+    ).scalar()
+
+
+def _fuzzy_rowids(session: Session, fts_table: str, term: str, limit: int) -> list[int]:
+    """
+    Rows sharing at least half of term's trigrams, most shared first
+    Such a row contains one of the (n - required + 1) rarest trigrams, so only
+    those are matched to find candidates; common trigrams like "com" are only
+    counted on the candidates.
+    """
+    term = term.lower()
+    trigrams = list(dict.fromkeys(term[i:i + 3] for i in range(len(term) - 2)))[:MAX_FUZZY_TRIGRAMS]
+    required = max(2, (len(trigrams) + 1) // 2)
+    if len(trigrams) < required:
+        return []
+    rarest = sorted(trigrams, key=lambda t: _trigram_rows(session, fts_table, t))
+    params = {f"t{i}": trigram for i, trigram in enumerate(trigrams)}
+    shared = " + ".join(f"(instr(doc, :{name}) > 0)" for name in params)
+    return _ranked_rowids(
+        session, fts_table,
+        " OR ".join(_phrase(t) for t in rarest[:len(trigrams) - required + 1]),
+        f"CASE WHEN {shared} >= :required THEN -({shared}) END",
+        {**params, "required": required}, limit
+    )
+
+
+def _search_rowids(session: Session, fts_table: str, term: str, limit: int) -> list[int]:
+    """Substring matches first, then fuzzy matches to fill up to limit"""
+    rowids = _substring_rowids(session, fts_table, term, limit)
+    if len(rowids) < limit and len(term) > 3:
+        for rowid in _fuzzy_rowids(session, fts_table, term, limit):
+            if rowid not in rowids:
+                rowids.append(rowid)
+            if len(rowids) >= limit:
+                break
+    return rowids
+
+
+def _fetch_in_order(session: Session, sql: str, rowids: list[int]) -> list:
+    """Load source rows for rowids, keeping the ranking order"""
+    if not rowids:
+        return []
+    params = {f"r{i}": rowid for i, rowid in enumerate(rowids)}
+    placeholders = ", ".join(f":{name}" for name in params)
+    rows = session.execute(text(sql.format(rowids=placeholders)), params).mappings().all()
+    by_rowid = {row["rowid"]: row for row in rows}
+    return [by_rowid[rowid] for rowid in rowids if rowid in by_rowid]
+
+
+def search_users(session: Session, term: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+    """Search users by name, email or mobile number"""
+    term = (term or "").strip()
+    if not term:
+        return []
+
+    if len(term) < 3:
+        # Trigrams need at least three characters; fall back to prefix ranges on
+        # the NOCASE indexes, which SQLite combines as a multi-index OR
+        prefix_match = " OR ".join(
+            f"({column} COLLATE NOCASE >= :low AND {column} COLLATE NOCASE < :high)"
+            for column in USER_PREFIX_COLUMNS
+        )
+        rows = session.execute(
+            text(
+                "SELECT rowid, user_id, first_name, last_name, email, mobile_no, role FROM users "
+                f"WHERE {prefix_match} LIMIT :limit"
+            ),
+            {"low": term, "high": term + "\U0010ffff", "limit": limit}
+        ).mappings().all()
+    else:
+        rows = _fetch_in_order(
+            session,
+            "SELECT rowid, user_id, first_name, last_name, email, mobile_no, role "
+            "FROM users WHERE rowid IN ({rowids})",
+            _search_rowids(session, "users_fts", term, limit)
+        )
+
+    return [
+        {
+            "User ID": row["user_id"],
+            "Name": f"{row['first_name']} {row['last_name'] or ''}",
+            "Email": row["email"],
+            "Mobile": row["mobile_no"],
+            "Role": RoleEnum[row["role"]].value if row["role"] else "donor"
+        }
+        for row in rows
+    ]
+
+
+def search_requests(session: Session, term: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+    """Search blood requests by hospital name or notes"""
+    term = (term or "").strip()
+    if len(term) < 3:
+        return []
+
+    rows = _fetch_in_order(
+        session,
+        "SELECT r.rowid, r.request_id, r.hospital_name, r.notes, r.status, r.urgency, g.blood_type "
+        "FROM blood_requests r JOIN blood_groups g ON g.blood_id = r.blood_id "
+        "WHERE r.rowid IN ({rowids})",
+        _search_rowids(session, "blood_requests_fts", term, limit)
+    )
+    return [
+        {
+            "Request ID": row["request_id"],
+            "Hospital": row["hospital_name"] or "",
+            "Blood Type": row["blood_type"],
+            "Urgency": row["urgency"],
+            "Status": row["status"],
+            "Notes": row["notes"] or ""
+        }
+        for row in rows
+    ]
+
+
+@register_job("rebuild_search_index")
+def rebuild_search_index_job(session: Session, payload: dict) -> dict:
+    """Re-index users and requests, e.g. after a VACUUM"""
+    rebuild_search_index(session.get_bind())
+    return {"tables": list(SEARCH_TABLES)}
@@ -0,0 +1,230 @@
+"""
+Server-side login sessions for Blood Management System
+
+Sessions are rows in the user_sessions table, so they survive restarts and are
+shared by every replica using the same database. The browser only holds a
+signed token. Each session keeps a JSON snapshot of the user's profile, which
+reruns read instead of querying the users table; the snapshot is cleared when
+the profile or role changes and rebuilt on the next read.
+
+Tokens are rotated once they are SESSION_ROTATE_MINUTES old rather than on
+every read, so reruns stay read-only. The replaced token keeps working for
+SESSION_ROTATE_GRACE_MINUTES, and presenting it hands back the current token,
+so reruns racing a rotation, other tabs and Back navigation don't log out.
+"""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from database import User, BloodGroup, UserSession, AppSetting
+from jobs import register_job, schedule_periodic
+from statements import USER_SESSION, USER_SESSION_BY_PREVIOUS
+
+
+SESSION_TTL_HOURS = 12
+SESSION_ROTATE_MINUTES = 15
+SESSION_ROTATE_GRACE_MINUTES = 5
+
+_secret = None
+
+
+def _get_secret(session: Session) -> bytes:
+    """
+    Signing key from SESSION_SECRET, or one generated and stored in app_settings
+    Storing it in the database lets every replica verify the same tokens.
+    """
+    global _secret
+    if _secret is None:
+        value = os.environ.get("SESSION_SECRET")
+        if not value:
+            session.execute(
+                insert(AppSetting).prefix_with("OR IGNORE").values(
+                    key="session_secret", value=secrets.token_hex(32)
+                )
+            )
+            session.commit()
+            value = session.query(AppSetting.value).filter(AppSetting.key == "session_secret").scalar()
+        _secret = value.encode("utf-8")
+    return _secret
+
+
+def _sign(session: Session, session_id: str) -> str:
+    return hmac.new(_get_secret(session), session_id.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _split_token(session: Session, token: str) -> str:
+    """Return the session ID of a correctly signed token, else None"""
+    if not token or "." not in token:
+        return None
+    session_id, signature = token.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _sign(session, session_id)):
+        return None
+    return session_id
+
+
+def build_profile(session: Session, user_id: str) -> dict:
+    """Load the profile snapshot kept with a login session"""
+    row = session.query(User, BloodGroup.blood_type).outerjoin(
+        BloodGroup, User.blood_id == BloodGroup.blood_id
+    ).filter(User.user_id == user_id).first()
+    if not row:
+        return None
+
+    user, blood_type = row
+    return {
+        "user_id": user.user_id,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "role": user.role.value if user.role else "donor",
+        "branch_id": user.branch_id,
+        "mobile_no": user.mobile_no,
+        "pincode": user.pincode,
+        "blood_id": user.blood_id,
+        "blood_type": blood_type,
+        "gender": user.gender.value if user.gender else None,
+        "date_of_birth": user.date_of_birth.isoformat() if user.date_of_birth else None,
+        "last_donation_date": user.last_donation_date.isoformat() if user.last_donation_date else None
+    }
+
+
+def create_user_session(session: Session, user: User) -> tuple[str, dict]:
+    """
+    Start a login session for an authenticated user
+    Returns (token, profile)
+    """
+    session_id = secrets.token_urlsafe(32)
+    profile = build_profile(session, user.user_id)
+    session.add(UserSession(
+        session_id=session_id,
+        user_id=user.user_id,
+        expires_at=datetime.utcnow() + timedelta(hours=SESSION_TTL_HOURS),
+        profile=json.dumps(profile)
+    ))
+    session.commit()
+    return f"{session_id}.{_sign(session, session_id)}", profile
+
+
+def _rotated_session(session: Session, session_id: str) -> UserSession:
+    """Session that replaced session_id within the grace period, else None"""
+    return session.execute(USER_SESSION_BY_PREVIOUS, {
+        "session_id": session_id,
+        "rotated_after": datetime.utcnow() - timedelta(minutes=SESSION_ROTATE_GRACE_MINUTES)
+    }).scalar()
+
+
+def _live_session(session: Session, token: str) -> tuple[UserSession, dict]:
+    """
+    Session row and profile for a current or recently replaced token
+    Returns (None, None) if the token is invalid, expired or revoked.
+    """
+    session_id = _split_token(session, token)
+    if not session_id:
+        return None, None
+
+    row = session.execute(USER_SESSION, {"session_id": session_id}).scalar()
+    if not row:
+        row = _rotated_session(session, session_id)
+    if not row or row.revoked_at or row.expires_at <= datetime.utcnow():
+        return None, None
+
+    if row.profile:
+        return row, json.loads(row.profile)
+
+    profile = build_profile(session, row.user_id)
+    if profile:
+        row.profile = json.dumps(profile)
+        session.commit()
+    return row, profile
+
+
+def resolve_user_session(session: Session, token: str) -> dict:
+    """
+    Return the profile for a valid token, or None if it is invalid, expired or revoked
+    Only reads the user_sessions row unless the snapshot was invalidated.
+    """
+    return _live_session(session, token)[1]
+
+
+def refresh_user_session(session: Session, token: str) -> tuple[str, dict]:
+    """
+    Resolve a token, rotating it once it is SESSION_ROTATE_MINUTES old
+    A token replaced within the grace period resolves to the current one.
+    Returns (current_token, profile), or (None, None) for an invalid token.
+    """
+    row, profile = _live_session(session, token)
+    if profile is None:
+        return None, None
+
+    session_id = _split_token(session, token)
+    if row.session_id != session_id:
+        return f"{row.session_id}.{_sign(session, row.session_id)}", profile
+    now = datetime.utcnow()
+    if (row.rotated_at or row.created_at) > now - timedelta(minutes=SESSION_ROTATE_MINUTES):
+        return token, profile
+
+    new_session_id = secrets.token_urlsafe(32)
+    result = session.execute(
+        update(UserSession)
+        .where(UserSession.session_id == session_id, UserSession.revoked_at.is_(None))
+        .values(session_id=new_session_id, previous_session_id=session_id, rotated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    if result.rowcount != 1:
+        # Another rerun rotated this token first; follow it to the new one
+        row = _rotated_session(session, session_id)
+        if not row or row.revoked_at:
+            return None, None
+        new_session_id = row.session_id
+    return f"{new_session_id}.{_sign(session, new_session_id)}", profile
+
+
+def revoke_user_session(session: Session, token: str):
+    """Log out a single session, by its current or previous token"""
+    session_id = _split_token(session, token)
+    if session_id:
+        session.execute(
+            update(UserSession)
+            .where((UserSession.session_id == session_id) | (UserSession.previous_session_id == session_id))
+            .values(revoked_at=datetime.utcnow())
+        )
+        session.commit()
+
+
+def revoke_user_sessions(session: Session, user_id: str):
+    """Log out every session of a user"""
+    session.execute(
+        update(UserSession)
+        .where(UserSession.user_id == user_id, UserSession.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    session.commit()
+
+
+def invalidate_user_profile(session: Session, user_id: str):
+    """Drop cached profile snapshots; commits with the caller's profile or role change"""
+    session.execute(
+        update(UserSession)
+        .where(UserSession.user_id == user_id)
+        .values(profile=None)
+    )
+
+
+@register_job("purge_expired_sessions")
+def purge_expired_sessions(session: Session, payload: dict) -> dict:
+    """Delete sessions that expired or were revoked more than a day ago"""
+    cutoff = datetime.utcnow() - timedelta(days=1)
+    count = session.query(UserSession).filter(
+        (UserSession.expires_at < cutoff) | (UserSession.revoked_at < cutoff)
+    ).delete(synchronize_session=False)
+    session.commit()
+    return {"deleted": count}
+
+
+schedule_periodic("purge_expired_sessions", 3600)
@@ -0,0 +1,174 @@
+"""
+Prebuilt SQL statements for the queries page renders run on every rerun
+
+Fixed-shape statements are built once at import with bind parameters. A rerun
+then skips building the query, and SQLAlchemy finds the compiled SQL in the
+engine's compiled cache (sized by database.QUERY_CACHE_SIZE). Statements whose
+shape depends on an argument use lambda_stmt, which caches the built construct
+per code location and turns closure variables into bind parameters.
+
+List statements select only the columns their view shows and join the names it
+displays, so rendering a list doesn't lazy-load a relationship per row.
+"""
+from sqlalchemy import select, bindparam, lambda_stmt, func, case, cast, and_, or_, Integer
+from sqlalchemy.orm import aliased
+from database import (
+    User, Branch, BloodGroup, BloodRequest, BloodDonation, BloodInventory, BloodTransfer,
+    BloodRequestArchive, BloodDonationArchive, UserSession, RoleEnum
+)
+
+
+# Login session lookup (session_store.resolve_user_session); params: session_id
+USER_SESSION = select(UserSession).where(UserSession.session_id == bindparam("session_id"))
+# Session whose previous ID this is, if rotated recently; params: session_id, rotated_after
+USER_SESSION_BY_PREVIOUS = select(UserSession).where(
+    UserSession.previous_session_id == bindparam("session_id"),
+    UserSession.rotated_at >= bindparam("rotated_after")
+)
+
+# Branch and blood group pickers
+BRANCH_LIST = select(Branch.branch_id, Branch.name, Branch.pincode).order_by(Branch.branch_id)
+BLOOD_GROUP_OPTIONS = select(BloodGroup.blood_type, BloodGroup.blood_id).order_by(BloodGroup.blood_id)
+
+# Staff dashboard; params: branch_id (and limit)
+STAFF_PENDING_REQUESTS = select(
+    BloodRequest.request_id,
+    BloodRequest.blood_id,
+    BloodRequest.units_required,
+    BloodRequest.urgency,
+    BloodRequest.hospital_name,
+    BloodRequest.request_date,
+    BloodGroup.blood_type,
+    User.first_name,
+    User.last_name,
+    func.coalesce(BloodInventory.units_available, 0).label("units_available")
+).join(
+    BloodGroup, BloodRequest.blood_id == BloodGroup.blood_id
+).join(
+    User, BloodRequest.requester_id == User.user_id
+).outerjoin(
+    BloodInventory,
+    and_(BloodInventory.branch_id == BloodRequest.branch_id, BloodInventory.blood_id == BloodRequest.blood_id)
+).where(
+    BloodRequest.branch_id == bindparam("branch_id"),
+    BloodRequest.status == "pending"
+).order_by(
+    BloodRequest.urgency.desc(),
+    BloodRequest.request_date
+)
+
+STAFF_RECENT_DONATIONS = select(
+    BloodDonation.donation_date,
+    User.first_name,
+    User.last_name,
+    BloodGroup.blood_type,
+    BloodDonation.units_donated,
+    BloodDonation.status
+).join(
+    User, BloodDonation.donor_id == User.user_id
+).join(
+    BloodGroup, BloodDonation.blood_id == BloodGroup.blood_id
+).where(
+    BloodDonation.branch_id == bindparam("branch_id")
+).order_by(
+    BloodDonation.donation_date.desc()
+).limit(bindparam("limit"))
+
+_FromBranch = aliased(Branch)
+_ToBranch = aliased(Branch)
+RECENT_TRANSFERS = select(
+    BloodTransfer.transfer_id,
+    BloodTransfer.transfer_date,
+    _FromBranch.name.label("from_name"),
+    _ToBranch.name.label("to_name"),
+    BloodGroup.blood_type,
+    BloodTransfer.units
+).join(
+    _FromBranch, BloodTransfer.from_branch_id == _FromBranch.branch_id
+).join(
+    _ToBranch, BloodTransfer.to_branch_id == _ToBranch.branch_id
+).join(
+    BloodGroup, BloodTransfer.blood_id == BloodGroup.blood_id
+).where(
+    or_(BloodTransfer.from_branch_id == bindparam("branch_id"), BloodTransfer.to_branch_id == bindparam("branch_id"))
+).order_by(
+    BloodTransfer.transfer_date.desc()
+).limit(bindparam("limit"))
+
+# Admin dashboard
+ADMIN_USERS = select(
+    User.user_id,
+    User.first_name,
+    User.last_name,
+    User.email,
+    User.role,
+    User.mobile_no,
+    BloodGroup.blood_type
+).outerjoin(
+    BloodGroup, User.blood_id == BloodGroup.blood_id
+).order_by(User.user_id)
+
+STAFF_MEMBERS = select(User.user_id, User.first_name, User.last_name).where(
+    User.role == RoleEnum.STAFF
+).order_by(User.user_id)
+
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+
+# Every admin statistic in one round trip, counting both history tiers
+ADMIN_STATISTICS = select(
+    _count(User).label("total_users"),
+    _count(User, User.role == RoleEnum.DONOR).label("total_donors"),
+    (_count(BloodRequest) + _count(BloodRequestArchive)).label("total_requests"),
+    (_count(BloodDonation) + _count(BloodDonationArchive)).label("total_donations"),
+    _count(BloodRequest, BloodRequest.status == "pending").label("pending_requests")
+)
+
+
+def branch_inventory_statement(branch_id: str = None):
+    """Inventory levels with branch and blood type names, for one branch or every branch"""
+    stmt = lambda_stmt(lambda: select(
+        Branch.name.label("branch_name"),
+        BloodGroup.blood_type,
+        BloodInventory.units_available,
+        BloodInventory.units_reserved
+    ).select_from(BloodInventory).join(
+        Branch, BloodInventory.branch_id == Branch.branch_id
+    ).join(
+        BloodGroup, BloodInventory.blood_id == BloodGroup.blood_id
+    ))
+    if branch_id:
+        stmt += lambda s: s.where(BloodInventory.branch_id == branch_id)
+    stmt += lambda s: s.order_by(Branch.name, BloodGroup.blood_type)
+    return stmt
+
+
+def nearest_stock_statement(blood_type: str, compatible_types: list[str], units: int, pincode: str,
+                            exclude_branch_id: str = None):
+    """Branches holding enough compatible units, closest pincode first (see branches.nearest_branch_with_stock)"""
+    target = int(pincode)
+    stmt = lambda_stmt(lambda: select(
+        Branch.branch_id,
+        Branch.name,
+        Branch.pincode,
+        BloodGroup.blood_id,
+        BloodGroup.blood_type,
+        BloodInventory.units_available
+    ).select_from(Branch).join(
+        BloodInventory, BloodInventory.branch_id == Branch.branch_id
+    ).join(
+        BloodGroup, BloodInventory.blood_id == BloodGroup.blood_id
+    ).where(
+        BloodGroup.blood_type.in_(compatible_types),
+        BloodInventory.units_available >= units
+    ))
+    if exclude_branch_id:
+        stmt += lambda s: s.where(Branch.branch_id != exclude_branch_id)
+    stmt += lambda s: s.order_by(
+        func.abs(cast(Branch.pincode, Integer) - target),
+        case((BloodGroup.blood_type == blood_type, 0), else_=1),
+        BloodInventory.units_available.desc()
+    ).limit(1)
+    return stmt
@@ -0,0 +1,53 @@
+"""
+Shared fixtures: a temporary database with blood groups and the main branch
+"""
+from itertools import count
+
+import pytest
+
+from database import User, BloodGroup, RoleEnum, get_session, get_or_create_engine
+from auth import initialize_blood_groups
+from branches import initialize_branches
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "test.db")
+
+
+@pytest.fixture
+def engine(db_path):
+    engine = get_or_create_engine(db_path)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = get_session(engine)
+    initialize_blood_groups(session)
+    initialize_branches(session)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def blood_ids(session):
+    return dict(session.query(BloodGroup.blood_type, BloodGroup.blood_id).all())
+
+
+@pytest.fixture
+def add_user(session, blood_ids):
+    """Create a user; keyword arguments override the defaults"""
+    numbers = count(1)
+
+    def add(user_id: str, blood_type: str = "O+", pincode: str = "560001", role=RoleEnum.DONOR, **fields):
+        user = User(
+            user_id=user_id, first_name=fields.pop("first_name", "Test"), email=f"{user_id.lower()}@example.com",
+            mobile_no=fields.pop("mobile_no", f"9{next(numbers):09d}"), password_hash="x",
+            pincode=pincode, role=role, blood_id=blood_ids[blood_type], **fields
+        )
+        session.add(user)
+        session.commit()
+        return user
+    return add
@@ -0,0 +1,115 @@
+"""
+Keyset-paginated history across the hot and archive tiers
+"""
+from datetime import datetime, timedelta
+
+from database import (
+    BloodDonation, BloodRequest, BloodDonationArchive, BloodRequestArchive, Notification, RoleEnum
+)
+from archive import archive_history
+from history import donation_history_page, request_history_page, all_requests_page
+
+
+def all_pages(fetch_page, page_size):
+    """Follow next cursors from the first page; return every row and the page sizes"""
+    rows, sizes, cursor = [], [], None
+    while True:
+        page, cursor = fetch_page(cursor, page_size)
+        rows.extend(page)
+        sizes.append(len(page))
+        if cursor is None:
+            return rows, sizes
+
+
+def add_donations(session, blood_ids, donor_id, dates):
+    for i, donation_date in enumerate(dates):
+        session.add(BloodDonation(
+            donation_id=f"DN{i:04d}", donor_id=donor_id, blood_id=blood_ids["O+"], donation_date=donation_date
+        ))
+    session.commit()
+
+
+def test_donation_pages_span_both_tiers_in_order(session, blood_ids, add_user):
+    add_user("D1")
+    add_user("D2")
+    now = datetime.utcnow().replace(microsecond=0)
+    # Pairs of donations share a date, so pages also break ties on the ID
+    dates = [now - timedelta(days=100 * (i // 2)) for i in range(11)]
+    add_donations(session, blood_ids, "D1", dates)
+    session.add(BloodDonation(donation_id="DN9999", donor_id="D2", blood_id=blood_ids["O+"], donation_date=now))
+    session.commit()
+
+    assert archive_history(session, days=150)["donations"] == 7
+    assert session.query(BloodDonationArchive).count() == 7
+
+    rows, sizes = all_pages(lambda cursor, size: donation_history_page(session, "D1", cursor, size), 3)
+    assert sizes == [3, 3, 3, 2]
+    keys = [(row.donation_date, row.donation_id) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert sorted(row.donation_id for row in rows) == [f"DN{i:04d}" for i in range(11)]
+    assert [row.archived for row in rows] == [False] * 4 + [True] * 7
+
+
+def test_request_pages_keep_open_requests_hot(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    old = datetime.utcnow() - timedelta(days=400)
+    for i, status in enumerate(["pending", "fulfilled", "cancelled", "fulfilled", "pending"]):
+        session.add(BloodRequest(
+            request_id=f"RQ{i + 1:04d}", requester_id="R1", blood_id=blood_ids["A+"], units_required=1,
+            status=status, request_date=old + timedelta(days=i)
+        ))
+    session.commit()
+
+    assert archive_history(session)["requests"] == 3
+    rows, sizes = all_pages(lambda cursor, size: request_history_page(session, "R1", cursor, size), 2)
+    assert sizes == [2, 2, 1]
+    assert [row.request_id for row in rows] == ["RQ0005", "RQ0004", "RQ0003", "RQ0002", "RQ0001"]
+    assert [row.request_id for row in rows if row.archived] == ["RQ0004", "RQ0003", "RQ0002"]
+    assert session.query(BloodRequestArchive).count() == 3
+
+
+def test_exact_page_size_has_no_next_cursor(session, blood_ids, add_user):
+    add_user("D1")
+    add_donations(session, blood_ids, "D1", [datetime.utcnow() - timedelta(days=i) for i in range(4)])
+    rows, cursor = donation_history_page(session, "D1", page_size=4)
+    assert len(rows) == 4 and cursor is None
+    assert donation_history_page(session, "D2") == ([], None)
+
+
+def test_admin_listing_merges_archived_requests_only_on_request(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER, first_name="Ravi")
+    add_user("R2", role=RoleEnum.REQUESTER, first_name="Uma")
+    old = datetime.utcnow() - timedelta(days=400)
+    for i in range(6):
+        session.add(BloodRequest(
+            request_id=f"RQ{i + 1:04d}", requester_id=f"R{i % 2 + 1}", blood_id=blood_ids["A+"], units_required=1,
+            status="fulfilled" if i < 4 else "pending", request_date=old + timedelta(days=i)
+        ))
+    session.commit()
+    assert archive_history(session)["requests"] == 4
+
+    rows, cursor = all_requests_page(session)
+    assert [row.request_id for row in rows] == ["RQ0006", "RQ0005"] and cursor is None
+
+    rows, sizes = all_pages(lambda cursor, size: all_requests_page(session, cursor, size, include_archived=True), 4)
+    assert sizes == [4, 2]
+    assert [(row.request_id, row.first_name, row.archived) for row in rows] == [
+        ("RQ0006", "Uma", False), ("RQ0005", "Ravi", False), ("RQ0004", "Uma", True),
+        ("RQ0003", "Ravi", True), ("RQ0002", "Uma", True), ("RQ0001", "Ravi", True)
+    ]
+
+
+def test_archiving_a_request_deletes_its_notifications(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_user("D1")
+    old = datetime.utcnow() - timedelta(days=400)
+    for request_id, status in [("RQ0001", "fulfilled"), ("RQ0002", "pending")]:
+        session.add(BloodRequest(
+            request_id=request_id, requester_id="R1", blood_id=blood_ids["O+"], units_required=1,
+            status=status, request_date=old
+        ))
+        session.add(Notification(request_id=request_id, user_id="D1", address="d1@example.com"))
+    session.commit()
+
+    assert archive_history(session)["requests"] == 1
+    assert [request_id for (request_id,) in session.query(Notification.request_id)] == ["RQ0002"]
@@ -0,0 +1,104 @@
+"""
+Job leases: claiming, renewal, expiry and the abandoned-job sweep
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import BackgroundJob, get_session
+from jobs import register_job, submit_job, claim_job, renew_lease, run_job, fail_abandoned_jobs, get_job
+
+
+@register_job("test_sleep")
+def sleep_job(session, payload):
+    time.sleep(payload["seconds"])
+    return {"slept": payload["seconds"]}
+
+
+@register_job("test_fail")
+def fail_job(session, payload):
+    raise ValueError("boom")
+
+
+def test_claim_is_exclusive(session):
+    job, error = submit_job(session, "test_sleep", {"seconds": 0})
+    assert error is None
+
+    claimed = claim_job(session, "w1", lease_seconds=60)
+    assert claimed.job_id == job.job_id
+    assert (claimed.status, claimed.lease_owner, claimed.attempts) == ("running", "w1", 1)
+    assert claim_job(session, "w2", lease_seconds=60) is None
+
+
+def test_renew_lease_extends_only_the_owners_lease(session):
+    submit_job(session, "test_sleep", {"seconds": 0})
+    job = claim_job(session, "w1", lease_seconds=10)
+    first_expiry = job.lease_expires_at
+
+    assert renew_lease(session, job.job_id, "w1", lease_seconds=60)
+    assert get_job(session, job.job_id).lease_expires_at > first_expiry
+    assert not renew_lease(session, job.job_id, "w2", lease_seconds=60)
+
+
+def test_expired_lease_is_reclaimed_while_attempts_remain(session):
+    submit_job(session, "test_sleep", {"seconds": 0}, max_attempts=2)
+    job = claim_job(session, "w1", lease_seconds=60)
+    session.query(BackgroundJob).update({"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    session.commit()
+
+    reclaimed = claim_job(session, "w2", lease_seconds=60)
+    assert (reclaimed.job_id, reclaimed.lease_owner, reclaimed.attempts) == (job.job_id, "w2", 2)
+    assert not renew_lease(session, job.job_id, "w1")
+
+
+def test_sweep_fails_jobs_abandoned_on_their_last_attempt(session):
+    submit_job(session, "test_sleep", {"seconds": 0}, max_attempts=1)
+    job = claim_job(session, "w1", lease_seconds=60)
+    assert fail_abandoned_jobs(session) == 0
+
+    session.query(BackgroundJob).update({"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    session.commit()
+    assert claim_job(session, "w2") is None
+    assert fail_abandoned_jobs(session) == 1
+    job = get_job(session, job.job_id)
+    assert job.status == "failed" and "Lease expired" in job.last_error
+
+
+def test_heartbeat_keeps_a_long_job_leased(engine, session):
+    submit_job(session, "test_sleep", {"seconds": 2.5})
+    job = claim_job(session, "w1", lease_seconds=1)
+
+    stolen = []
+
+    def steal():
+        # Try to claim the job while it runs past its original lease
+        other = get_session(engine)
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            if claim_job(other, "w2", lease_seconds=1):
+                stolen.append(True)
+            time.sleep(0.2)
+        other.close()
+
+    thief = threading.Thread(target=steal)
+    thief.start()
+    assert run_job(session, job, "w1", lease_seconds=1)
+    thief.join()
+
+    assert not stolen
+    job = get_job(session, job.job_id)
+    assert (job.status, job.attempts) == ("succeeded", 1)
+
+
+def test_failures_retry_then_fail(session):
+    submit_job(session, "test_fail", max_attempts=2)
+    job = claim_job(session, "w1")
+    assert not run_job(session, job, "w1")
+    job = get_job(session, job.job_id)
+    assert job.status == "queued" and job.run_at > datetime.utcnow() and "boom" in job.last_error
+
+    session.query(BackgroundJob).update({"run_at": datetime.utcnow()})
+    session.commit()
+    job = claim_job(session, "w1")
+    assert not run_job(session, job, "w1")
+    assert get_job(session, job.job_id).status == "failed"
@@ -0,0 +1,105 @@
+"""
+Donor notification fan-out, throttling and delivery
+"""
+import json
+from datetime import date, datetime, timedelta
+
+from database import BloodRequest, BackgroundJob, Notification, RoleEnum
+from branches import DEFAULT_BRANCH_ID
+from notifications import (
+    FileSender, THROTTLE_HOURS, DONATION_INTERVAL_DAYS, fan_out_request, deliver_request_notifications,
+    notify_donors_job
+)
+
+
+def add_request(session, blood_ids, request_id="RQ0001", blood_type="A+", requester_id="R1"):
+    session.add(BloodRequest(
+        request_id=request_id, requester_id=requester_id, blood_id=blood_ids[blood_type], units_required=2,
+        urgency="critical", status="pending", branch_id=DEFAULT_BRANCH_ID, hospital_name="City Hospital"
+    ))
+    session.commit()
+
+
+def notified(session, request_id="RQ0001"):
+    return sorted(user_id for (user_id,) in session.query(Notification.user_id).filter(
+        Notification.request_id == request_id
+    ))
+
+
+def test_fan_out_selects_compatible_nearby_eligible_donors(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_user("D1", blood_type="O-")
+    add_user("D2", blood_type="A+", pincode="560099")
+    add_user("D3", blood_type="B+")                                   # incompatible
+    add_user("D4", blood_type="O+", pincode="110001")                 # too far
+    add_user("D5", blood_type="O+", last_donation_date=date.today() - timedelta(days=10))
+    add_user("D6", blood_type="O+", last_donation_date=date.today() - timedelta(days=DONATION_INTERVAL_DAYS))
+    add_user("S1", blood_type="O+", role=RoleEnum.STAFF)
+    add_request(session, blood_ids)
+
+    assert fan_out_request(session, "RQ0001") == 3
+    assert notified(session) == ["D1", "D2", "D6"]
+    assert fan_out_request(session, "RQ0001") == 0                    # re-running queues nothing new
+
+
+def test_throttle_skips_donors_notified_recently(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_user("D1")
+    add_user("D2")
+    add_request(session, blood_ids, "RQ0001")
+    add_request(session, blood_ids, "RQ0002")
+    add_request(session, blood_ids, "RQ0003")
+    now = datetime.utcnow()
+
+    assert fan_out_request(session, "RQ0001", now=now) == 2
+    assert fan_out_request(session, "RQ0002", now=now + timedelta(hours=THROTTLE_HOURS - 1)) == 0
+    assert fan_out_request(session, "RQ0003", now=now + timedelta(hours=THROTTLE_HOURS + 1)) == 2
+
+
+def test_delivery_writes_each_message_once(session, blood_ids, add_user, tmp_path):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_user("D1", first_name="Asha")
+    add_user("D2")
+    add_request(session, blood_ids)
+    fan_out_request(session, "RQ0001")
+    outbox = tmp_path / "outbox.jsonl"
+
+    counts = deliver_request_notifications(session, "RQ0001", sender=FileSender(str(outbox)), batch_size=1)
+    assert counts == {"sent": 2, "failed": 0, "pending": 0}
+    messages = [json.loads(line) for line in outbox.read_text().splitlines()]
+    assert sorted(message["to"] for message in messages) == ["d1@example.com", "d2@example.com"]
+    assert any(message["body"].startswith("Hi Asha") for message in messages)
+    assert {status for (status,) in session.query(Notification.status)} == {"sent"}
+
+    deliver_request_notifications(session, "RQ0001", sender=FileSender(str(outbox)))
+    assert len(outbox.read_text().splitlines()) == 2
+
+
+def test_failed_sends_stay_queued_for_retry(session, blood_ids, add_user):
+    class FailingSender(FileSender):
+        async def send(self, message):
+            raise ConnectionError("smtp down")
+
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_user("D1")
+    add_request(session, blood_ids)
+    fan_out_request(session, "RQ0001")
+
+    assert deliver_request_notifications(session, "RQ0001", sender=FailingSender()) == {
+        "sent": 0, "failed": 0, "pending": 1
+    }
+    notification = session.query(Notification).one()
+    assert (notification.status, notification.attempts) == ("queued", 1)
+    assert "smtp down" in notification.last_error
+
+
+def test_notify_job_queues_one_delivery_job(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_user("D1")
+    add_request(session, blood_ids)
+
+    assert notify_donors_job(session, {"request_id": "RQ0001"}) == {"queued": 1}
+    # A retry after fan-out already ran still has queued notifications to deliver
+    assert notify_donors_job(session, {"request_id": "RQ0001"}) == {"queued": 0}
+    jobs = session.query(BackgroundJob.job_type, BackgroundJob.dedupe_key).all()
+    assert jobs == [("deliver_notifications", "deliver:RQ0001")]
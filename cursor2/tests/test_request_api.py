@@ -0,0 +1,56 @@
+"""
+Batch request submission: request ID allocation and donor fan-out jobs
+"""
+import json
+from datetime import datetime
+
+from database import BloodRequest, BloodRequestArchive, BackgroundJob, RoleEnum
+from auth import generate_id
+from request_api import submit_requests, allocate_request_ids
+
+
+def add_request(session, blood_ids, request_id, model=BloodRequest, **fields):
+    session.add(model(
+        request_id=request_id, requester_id="R1", blood_id=blood_ids["A+"], units_required=1, **fields
+    ))
+    session.commit()
+
+
+def item(urgency="normal"):
+    return {"blood_type": "A+", "units_required": 1, "urgency": urgency}
+
+
+def test_ids_continue_numerically_past_rq9999(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_request(session, blood_ids, "RQ9998")
+
+    results, errors = submit_requests(session, "R1", [item(), item(), item()])
+    assert errors == []
+    assert [result["request_id"] for result in results] == ["RQ9999", "RQ10000", "RQ10001"]
+    # "RQ9999" sorts after "RQ10001" as text; allocation compares the number
+    assert generate_id(session, BloodRequest, "request_id", "RQ") == "RQ10002"
+
+
+def test_allocation_counts_archived_ids(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    add_request(session, blood_ids, "RQ0005")
+    add_request(session, blood_ids, "RQ12000", BloodRequestArchive, archived_at=datetime.utcnow())
+    assert allocate_request_ids(session, 2) == ["RQ12001", "RQ12002"]
+
+
+def test_critical_requests_queue_fan_out_jobs_with_the_batch(session, blood_ids, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    results, errors = submit_requests(session, "R1", [item("critical"), item(), item("critical")])
+    assert errors == []
+
+    jobs = session.query(BackgroundJob).filter(BackgroundJob.job_type == "notify_donors").all()
+    assert sorted(json.loads(job.payload)["request_id"] for job in jobs) == ["RQ0001", "RQ0003"]
+    assert {(job.status, job.priority, job.submitted_by) for job in jobs} == {("queued", 10, "R1")}
+
+
+def test_invalid_batch_inserts_nothing(session, add_user):
+    add_user("R1", role=RoleEnum.REQUESTER)
+    results, errors = submit_requests(session, "R1", [item("critical"), {"blood_type": "Z+", "units_required": 1}])
+    assert results == [] and errors == ["request 1: unknown blood type 'Z+'"]
+    assert session.query(BloodRequest).count() == 0
+    assert session.query(BackgroundJob).count() == 0
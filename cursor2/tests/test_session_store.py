@@ -0,0 +1,92 @@
+"""
+Login session tokens: resolution, interval rotation with a grace period, revocation
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import session_store
+from database import User, UserSession, get_session
+from session_store import (
+    SESSION_ROTATE_MINUTES, SESSION_ROTATE_GRACE_MINUTES, create_user_session, resolve_user_session,
+    refresh_user_session, revoke_user_session, revoke_user_sessions, invalidate_user_profile
+)
+
+
+@pytest.fixture
+def login(session, add_user):
+    user = add_user("U1", first_name="Asha")
+    return create_user_session(session, user)
+
+
+def age_session(session, minutes: float, column: str = "created_at"):
+    session.query(UserSession).update({column: datetime.utcnow() - timedelta(minutes=minutes)})
+    session.commit()
+
+
+def test_resolve_rejects_tampered_tokens(session, login):
+    token, profile = login
+    assert profile["first_name"] == "Asha"
+    assert resolve_user_session(session, token) == profile
+    assert resolve_user_session(session, token[:-1] + ("0" if token[-1] != "0" else "1")) is None
+    assert resolve_user_session(session, "not-a-token") is None
+
+
+def test_refresh_only_reads_until_rotation_is_due(session, login):
+    token, profile = login
+    assert refresh_user_session(session, token) == (token, profile)
+    assert session.query(UserSession.rotated_at).scalar() is None
+
+
+def test_rotation_accepts_the_old_token_for_the_grace_period(session, login):
+    token, profile = login
+    age_session(session, SESSION_ROTATE_MINUTES + 1)
+
+    new_token, new_profile = refresh_user_session(session, token)
+    assert new_token != token and new_profile == profile
+    # A rerun or another tab still holding the old token is moved to the new one
+    assert refresh_user_session(session, token) == (new_token, profile)
+    assert resolve_user_session(session, token) == profile
+
+    age_session(session, SESSION_ROTATE_GRACE_MINUTES + 1, "rotated_at")
+    assert refresh_user_session(session, token) == (None, None)
+    assert refresh_user_session(session, new_token)[1] == profile
+
+
+def test_losing_a_rotation_race_follows_the_winner(engine, session, login, monkeypatch):
+    token, profile = login
+    age_session(session, SESSION_ROTATE_MINUTES + 1)
+    stale = session_store._live_session(session, token)   # read before the other rerun rotates
+
+    other = get_session(engine)
+    winner, _ = refresh_user_session(other, token)
+    other.close()
+
+    monkeypatch.setattr(session_store, "_live_session", lambda s, t: stale)
+    assert refresh_user_session(session, token) == (winner, profile)
+
+
+def test_revoking_by_either_token_logs_the_session_out(session, login):
+    token, _ = login
+    age_session(session, SESSION_ROTATE_MINUTES + 1)
+    new_token, _ = refresh_user_session(session, token)
+
+    revoke_user_session(session, token)
+    assert refresh_user_session(session, new_token) == (None, None)
+    assert resolve_user_session(session, token) is None
+
+
+def test_revoke_all_sessions_of_a_user(session, login):
+    token, _ = login
+    second, _ = create_user_session(session, session.get(User, "U1"))
+    revoke_user_sessions(session, "U1")
+    assert resolve_user_session(session, token) is None
+    assert resolve_user_session(session, second) is None
+
+
+def test_profile_snapshot_reloads_after_invalidation(session, login):
+    token, _ = login
+    session.get(User, "U1").first_name = "Asha R"
+    invalidate_user_profile(session, "U1")
+    session.commit()
+    assert resolve_user_session(session, token)["first_name"] == "Asha R"
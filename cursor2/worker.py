@@ -0,0 +1,27 @@
+"""
+Standalone background worker process for Blood Management System
+"""
+import os
+import time
+from database import get_or_create_engine
+from jobs import JobScheduler
+import notifications  # noqa: F401  registers notification job handlers
+import session_store  # noqa: F401  registers session cleanup job
+import search  # noqa: F401  registers search index rebuild job
+import archive  # noqa: F401  registers the nightly archive job
+import backup  # noqa: F401  registers the snapshot job
+
+
+def main():
+    """Run job workers until interrupted"""
+    scheduler = JobScheduler(get_or_create_engine(), num_workers=int(os.environ.get("JOB_WORKERS", "2")))
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()